@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Video, Category
+from .models import Video, Category, ProfileRule, RequestProfile
 
 class VideoAdmin(admin.ModelAdmin):
     list_display = ['link', 'user', 'approved', 'denied', 'createdTime', 'likes']
@@ -8,3 +8,15 @@ class VideoAdmin(admin.ModelAdmin):
 
 admin.site.register(Video, VideoAdmin)
 admin.site.register(Category)
+
+class ProfileRuleAdmin(admin.ModelAdmin):
+    list_display = ['route', 'sample_rate', 'enabled']
+    list_editable = ['sample_rate', 'enabled']
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['route', 'method', 'path', 'status_code', 'duration_ms', 'db_queries', 'user', 'created_at']
+    list_filter = ['route']
+    exclude = ['stats']
+
+admin.site.register(ProfileRule, ProfileRuleAdmin)
+admin.site.register(RequestProfile, RequestProfileAdmin)
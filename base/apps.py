@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        # Registers the signal handlers that keep the category registry in sync, and the system checks
+        from . import category_registry, checks  # noqa: F401
+
+        # With gunicorn --preload this runs once in the master, so forked workers share
+        # the already imported client libraries and built clients
+        from django.conf import settings
+        if settings.PRELOAD_CLIENTS:
+            from . import trending
+            trending.warm_up()
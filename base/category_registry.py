@@ -0,0 +1,61 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, CategoryVersion
+
+_lock = threading.Lock()
+_registry = {'version': None, 'checked_at': None, 'by_id': {}, 'by_name': {}}
+
+
+def _current():
+    """
+    Category names and ids, loaded once per process. Other workers' writes are noticed
+    through the CategoryVersion row, read at most every CATEGORY_REGISTRY_CHECK_INTERVAL
+    seconds, so steady-state lookups cost one primary key read per interval at most.
+    """
+    now = time.monotonic()
+    checked_at = _registry['checked_at']
+    if checked_at is not None and now - checked_at < settings.CATEGORY_REGISTRY_CHECK_INTERVAL:
+        return _registry
+
+    with _lock:
+        version = CategoryVersion.objects.values_list('version', flat=True).first()
+        if version != _registry['version'] or _registry['checked_at'] is None:
+            by_id = dict(Category.objects.order_by('id').values_list('id', 'name'))
+            by_name = {}
+            for category_id, name in by_id.items():
+                by_name.setdefault(name, category_id)  # Lowest id wins, like .filter(name=...).first()
+            _registry.update(version=version, by_id=by_id, by_name=by_name)
+        _registry['checked_at'] = now
+    return _registry
+
+
+def names():
+    return list(_current()['by_name'])
+
+
+def id_for(name):
+    return _current()['by_name'].get(name)
+
+
+def name_of(category_id):
+    return _current()['by_id'].get(category_id)
+
+
+def exists(category_id):
+    return category_id in _current()['by_id']
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate(**kwargs):
+    # The version lives in the database rather than the cache, which is per process by
+    # default. Bumping it makes every worker reload on its next check, this one right away.
+    if not CategoryVersion.objects.update(version=F('version') + 1):
+        CategoryVersion.objects.create(version=1)
+    with _lock:
+        _registry['checked_at'] = None
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from myproj import database
+
+# Caches private to each worker process
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, Tags.database)
+def check_replicas_have_shared_cache(app_configs, **kwargs):
+    # ReadYourWritesMiddleware records that a client just wrote in the cache. With a
+    # per-process cache the next request of that client, served by another worker, would
+    # not see it and read a replica that may not have the write yet.
+    if database.replica_aliases() and settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Error(
+            "DATABASE_REPLICAS needs a cache shared by all workers.",
+            hint="Set CACHE_BACKEND and CACHE_LOCATION to redis, memcached or the database cache.",
+            id='base.E001',
+        )]
+    return []
@@ -0,0 +1,71 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import FloatField, Value
+from django.db.models.functions import Abs, Greatest, Log, Power
+
+# Hot scores are stored in log2 space: a video's score is
+#   log2(2 ** event_score(created) + sum(2 ** event_score(like) for each like))
+# where event_score counts half-lives since EPOCH. Ranking by it is the same as ranking by
+# like counts that halve every HOT_HALF_LIFE seconds, but the stored value never has to be
+# decayed (a newer like simply weighs more) and it cannot overflow.
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def event_score(when):
+    return (when - EPOCH).total_seconds() / settings.HOT_HALF_LIFE
+
+
+def current_score():
+    return event_score(datetime.now(timezone.utc))
+
+
+def combine(scores):
+    # log2(sum(2 ** s)), shifted by the maximum so large scores do not overflow
+    high = max(scores)
+    return high + math.log2(sum(2 ** (score - high) for score in scores))
+
+
+def add_expression(field, score):
+    # SQL version of combine([field, score]) so concurrent likes update the row atomically
+    score = Value(score, output_field=FloatField())
+    return Greatest(field, score) + Log(2, 1 + Power(2, -Abs(field - score)))
+
+
+def remove_expression(field, score, floor):
+    # Inverse of add_expression: log2(2 ** field - 2 ** score). Float drift could take the
+    # difference to zero or below, so the result never drops under `floor`, the score of
+    # the video's creation, which is always part of the sum. refresh_hot_scores fixes the rest.
+    score = Value(score, output_field=FloatField())
+    floor = Value(floor, output_field=FloatField())
+    remaining = Greatest(1 - Power(2, score - field), Value(2 ** -50, output_field=FloatField()))
+    return Greatest(field + Log(2, remaining), floor)
+
+
+def recompute(video_model, like_model, batch_size=500):
+    """
+    Rebuild every video's score from its likes, one batch of videos at a time so neither
+    memory nor a single transaction grows with the table. Takes the models as arguments
+    so migrations can pass their historical versions. Returns the number of videos.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(
+            video_model.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'createdTime')[:batch_size]
+        )
+        if not batch:
+            return updated
+        last_id = batch[-1][0]
+
+        scores = {video_id: [event_score(created)] for video_id, created in batch}
+        likes = like_model.objects.filter(video_id__in=scores).values_list('video_id', 'created_at')
+        for video_id, created in likes.iterator():
+            scores[video_id].append(event_score(created))
+
+        video_model.objects.bulk_update(
+            [video_model(id=video_id, hot_score=combine(events)) for video_id, events in scores.items()],
+            ['hot_score'],
+        )
+        updated += len(batch)
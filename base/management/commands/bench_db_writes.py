@@ -0,0 +1,112 @@
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+SCHEMA = [
+    'CREATE TABLE video (id INTEGER PRIMARY KEY, likes INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE video_like (id INTEGER PRIMARY KEY, user_id INTEGER, video_id INTEGER, UNIQUE (user_id, video_id))',
+]
+
+
+def database_config(mode, path):
+    from myproj.database import sqlite_database
+
+    if mode == 'tuned':
+        # Exactly what settings.DATABASES uses
+        return sqlite_database(path)
+    # What every request did before: Django's SQLite defaults and a new connection per request
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'CONN_MAX_AGE': 0, 'OPTIONS': {}}
+
+
+def like_videos(path, mode, worker, writes, videos, start, results):
+    # Runs in a fresh process that talks to the benchmark database through Django's default
+    # connection, so init_command, transaction_mode and CONN_MAX_AGE are applied by Django itself
+    import django
+    django.setup()
+    from django.db import OperationalError, close_old_connections, connection, transaction
+
+    # The same way the test runner points the connection at the test database
+    connection.settings_dict.update(database_config(mode, path))
+
+    rng = random.Random(worker)
+    done = errors = 0
+    start.wait()
+    for i in range(writes):
+        # One "like" request: check for an existing like, insert it and bump the counter
+        user_id, video_id = worker * writes + i, rng.randrange(videos) + 1
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT 1 FROM video_like WHERE user_id = %s AND video_id = %s', [user_id, video_id])
+                cursor.fetchone()
+                cursor.execute('INSERT INTO video_like (user_id, video_id) VALUES (%s, %s)', [user_id, video_id])
+                cursor.execute('UPDATE video SET likes = likes + 1 WHERE id = %s', [video_id])
+            done += 1
+        except OperationalError:
+            # "database is locked"
+            errors += 1
+        close_old_connections()  # What Django does when a request finishes
+    results.put((done, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare multi-process SQLite write throughput through Django connections with the old "
+        "default settings and the tuned settings from myproj/database.py, printing JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--writes', type=int, default=500, help="Writes per process.")
+        parser.add_argument('--videos', type=int, default=100)
+
+    def handle(self, *args, **options):
+        report = {'processes': options['processes'], 'writes_per_process': options['writes'], 'modes': {}}
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in ('default', 'tuned'):
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                conn = sqlite3.connect(path)
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                conn.executemany('INSERT INTO video (likes) VALUES (?)', [(0,)] * options['videos'])
+                conn.commit()
+                conn.close()
+                report['modes'][mode] = self.run_mode(path, mode, options)
+
+        default, tuned = report['modes']['default'], report['modes']['tuned']
+        report['speedup'] = round(tuned['writes_per_second'] / max(default['writes_per_second'], 1e-9), 2)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_mode(self, path, mode, options):
+        # Spawned rather than forked, so no worker inherits this process's open connections
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        start = context.Barrier(options['processes'] + 1)
+        workers = [
+            context.Process(
+                target=like_videos,
+                args=(path, mode, worker, options['writes'], options['videos'], start, results),
+            )
+            for worker in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        start.wait()  # Interpreter and Django start-up are not part of the measurement
+        started = time.perf_counter()
+        outcomes = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - started
+        for worker in workers:
+            worker.join()
+
+        done = sum(outcome[0] for outcome in outcomes)
+        return {
+            'writes': done,
+            'locked_errors': sum(outcome[1] for outcome in outcomes),
+            'seconds': round(elapsed, 3),
+            'writes_per_second': round(done / elapsed, 1),
+        }
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker imports before it serves its first request
+STARTUP_SCRIPT = "import django; django.setup(); import myproj.urls"
+
+# Startup measured about 400-460ms on a development machine, with headroom for slower ones.
+# Importing the client libraries eagerly again is caught by LAZY_MODULES below; the budget
+# catches broader regressions, such as a new heavy import anywhere on the startup path.
+# It is wall-clock time, so it is checked when the command runs in CI, not by the test suite.
+DEFAULT_MAX_MS = 600
+
+# Only needed for trending videos, base/trending.py imports them on first use.
+# requests stays out of this list, rest_framework.compat imports it anyway.
+LAZY_MODULES = ['googleapiclient', 'google.auth', 'httplib2', 'isodate']
+
+
+def parse_importtime(output):
+    """
+    Turns `python -X importtime` output into {module: (self_us, cumulative_us, depth)},
+    depth 0 being the modules imported directly by the script.
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker startup import time with python -X importtime, printing JSON. Fails if a "
+        "lazily loaded client library is imported at startup or the total exceeds --max-ms."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-ms', type=float, default=DEFAULT_MAX_MS,
+            help=f"Fail above this total import time (default {DEFAULT_MAX_MS}ms, 0 disables the check).",
+        )
+        parser.add_argument('--top', type=int, default=10, help="Number of slowest top-level imports to report.")
+        parser.add_argument('--runs', type=int, default=3, help="Report the fastest of this many runs.")
+
+    def handle(self, *args, **options):
+        # A fresh interpreter each run, this one has everything imported already
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'myproj.settings')}
+        env.pop('PRELOAD_CLIENTS', None)  # Measure what a worker imports, not the preloading master
+        runs = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                capture_output=True, text=True, env=env,
+            )
+            if result.returncode:
+                raise CommandError(f"Startup script failed:\n{result.stderr[-2000:]}")
+            runs.append(parse_importtime(result.stderr))
+
+        modules = min(runs, key=lambda run: sum(c for _, c, depth in run.values() if depth == 0))
+        top_level = sorted(
+            ((name, cumulative) for name, (_, cumulative, depth) in modules.items() if depth == 0),
+            key=lambda item: item[1], reverse=True,
+        )
+        total_ms = sum(cumulative for _, cumulative in top_level) / 1000
+        loaded_lazy = [name for name in LAZY_MODULES if name in modules]
+
+        report = {
+            'total_ms': round(total_ms, 1),
+            'modules': len(modules),
+            'top': [{'module': name, 'ms': round(cumulative / 1000, 1)} for name, cumulative in top_level[:options['top']]],
+            'lazy_modules_loaded': loaded_lazy,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if loaded_lazy:
+            raise CommandError(f"Imported at startup but should load lazily: {', '.join(loaded_lazy)}")
+        if options['max_ms'] and total_ms > options['max_ms']:
+            raise CommandError(f"Startup imports took {total_ms:.1f}ms, more than the {options['max_ms']}ms budget")
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base import profiling
+
+
+class Command(BaseCommand):
+    help = "Delete stored request profiles older than --days and beyond --keep per route."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--keep', type=int, default=None, help="Profiles kept per route, PROFILE_KEEP_PER_ROUTE by default.")
+
+    def handle(self, *args, **options):
+        keep = options['keep'] if options['keep'] is not None else settings.PROFILE_KEEP_PER_ROUTE
+        deleted = profiling.prune(keep=keep, older_than=timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} request profiles."))
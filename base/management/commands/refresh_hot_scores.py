@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from base import hot
+from base.models import Like, Video
+
+
+class Command(BaseCommand):
+    help = "Recompute Video.hot_score from the Like table, in batches of videos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Likes and unlikes update scores incrementally, so this corrects float drift and
+        # anything written outside the views. Run it periodically (e.g. daily cron).
+        updated = hot.recompute(Video, Like, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed hot scores for {updated} videos."))
@@ -0,0 +1,324 @@
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from base.models import Category, Like, Video
+from .seed_bench import USERNAME_PREFIX
+
+
+class YouTubeStub:
+    # Stands in for googleapiclient's youtube resource: youtube.videos().list(...).execute()
+    def __init__(self, items_per_category=55):
+        self.items_per_category = items_per_category
+
+    def videos(self):
+        return self
+
+    def list(self, videoCategoryId, **kwargs):
+        self.category = videoCategoryId
+        return self
+
+    def execute(self):
+        return {"items": [
+            {
+                "id": f"stub{self.category}{i:05d}",
+                "contentDetails": {"duration": f"PT{i % 20 + 1}M", "madeForKids": False},
+                "snippet": {
+                    "title": f"Trending video {i} #stub",
+                    "description": f"About topic {i}, see https://example.com",
+                    "defaultAudioLanguage": "en",
+                    "thumbnails": {"high": {"url": f"https://i.ytimg.com/vi/{i}/hqdefault.jpg"}},
+                    "channelTitle": "Stub channel",
+                    "publishedAt": "2024-11-22T18:13:00Z",
+                },
+            }
+            for i in range(self.items_per_category)
+        ]}
+
+
+class HuggingFaceResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def huggingface_stub(url, headers=None, json=None):
+    # Summaries for bart-large-cnn, zero-shot labels for bart-large-mnli
+    if "candidate_labels" in json.get("parameters", {}):
+        return HuggingFaceResponse({"labels": json["parameters"]["candidate_labels"]})
+    return HuggingFaceResponse([{"summary_text": json["inputs"][:200]}])
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API route against seeded data with offline YouTube/Hugging Face stubs "
+        "and report throughput, latency percentiles and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per route.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per route.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument(
+            '--use-existing-db', action='store_true',
+            help="Run against the configured database (seed it with seed_bench first) instead of a throwaway one.",
+        )
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--videos', type=int, default=500)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--likes', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--timing-rounds', type=int, default=5,
+            help="Rounds of interleaved requests when measuring the timing middleware overhead.",
+        )
+        parser.add_argument(
+            '--max-timing-overhead', type=float, default=2,
+            help="Fail when the timing middleware adds more than this percentage to the video list "
+                 "(default 2, 0 disables the check).",
+        )
+
+    def handle(self, *args, **options):
+        old_config = None
+        if not options['use_existing_db']:
+            old_config = setup_databases(verbosity=0, interactive=False)
+            call_command(
+                'seed_bench', users=options['users'], videos=options['videos'],
+                categories=options['categories'], likes=options['likes'], seed=options['seed'],
+                stdout=self.stderr,
+            )
+
+        debug = settings.DEBUG
+        settings.DEBUG = False  # Time the app the way production runs it
+        cache.clear()
+        try:
+            with mock.patch('base.trending.youtube_client', return_value=YouTubeStub()), \
+                    mock.patch('base.trending.http_session', return_value=mock.Mock(post=huggingface_stub)):
+                report = self.run(options)
+        finally:
+            settings.DEBUG = debug
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        overhead = report['timing_middleware']
+        if not overhead['within_budget']:
+            raise CommandError(
+                f"TimingMiddleware added {overhead['overhead_percent']}% to {overhead['route']}, "
+                f"more than the {overhead['max_overhead_percent']}% budget"
+            )
+
+    def run(self, options):
+        runner_name, staff_name, target_name = (
+            f"{USERNAME_PREFIX}runner", f"{USERNAME_PREFIX}staff", f"{USERNAME_PREFIX}target"
+        )
+        users = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .exclude(username__in=[runner_name, staff_name, target_name]).order_by('id')
+        )
+        if not users:
+            raise CommandError("No benchmark data found, run `manage.py seed_bench` first.")
+
+        runner, _ = User.objects.get_or_create(username=runner_name)
+        Like.objects.filter(user=runner).delete()
+        staff, _ = User.objects.get_or_create(username=staff_name, defaults={'is_staff': True})
+        target, _ = User.objects.get_or_create(username=target_name)  # Toggled by the admin routes
+        videos = list(Video.objects.filter(approved=True, denied=False).values_list('id', flat=True)[:500])
+        categories = list(Category.objects.values_list('id', flat=True))
+
+        clients = {}
+
+        def client_for(user):
+            # Real JWTs so authentication cost is part of the measurement
+            if user.id not in clients:
+                clients[user.id] = APIClient(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+            return clients[user.id]
+
+        anonymous = APIClient()
+
+        def like(i):
+            return client_for(runner).post(f'/videos/{videos[i % len(videos)]}/like/')
+
+        def unlike(i):
+            return client_for(runner).delete(f'/videos/{videos[i % len(videos)]}/unlike/')
+
+        def toggle_admin(i):
+            return client_for(staff).patch(f'/api/users/{target.id}/toggle-admin/')
+
+        def toggle_active(i):
+            return client_for(staff).patch(f'/users/{target.id}/toggle-active/')
+
+        # Each scenario is (name, function(i) -> response, untimed setup, untimed cleanup). Left out on
+        # purpose: token, token refresh, register and change-password, which are dominated by password
+        # hashing or token signing, and the operational metrics and profiling endpoints.
+        scenarios = [
+            ('video-list', lambda i: anonymous.get('/videos/'), None, None),
+            ('video-list-filtered', lambda i: anonymous.get(
+                '/videos/', {'category_1': categories[i % len(categories)]}), None, None),
+            ('video-list-hot', lambda i: anonymous.get('/videos/', {'ordering': 'hot'}), None, None),
+            ('video-list-staff', lambda i: client_for(staff).get('/videos/', {'approved': 'false'}), None, None),
+            ('video-list-authenticated', lambda i: client_for(users[i % len(users)]).get('/videos/'), None, None),
+            ('video-detail', lambda i: anonymous.get(f'/videos/{videos[i % len(videos)]}/'), None, None),
+            ('video-like', like, None, unlike),
+            ('video-unlike', unlike, like, None),
+            ('category-list', lambda i: anonymous.get('/categories/'), None, None),
+            ('liked-videos', lambda i: client_for(users[i % len(users)]).get('/api/liked-videos/'), None, None),
+            ('user-videos', lambda i: client_for(users[i % len(users)]).get('/api/user-videos/'), None, None),
+            ('user-profile', lambda i: client_for(users[i % len(users)]).get('/api/user/'), None, None),
+            ('user-list', lambda i: client_for(staff).get('/api/users/'), None, None),
+            ('toggle-admin', toggle_admin, None, toggle_admin),
+            ('toggle-active', toggle_active, None, toggle_active),
+            ('recommend-videos', lambda i: client_for(users[i % len(users)]).get('/api/recommend-videos/'), None, None),
+            ('popular-videos', lambda i: anonymous.get('/api/popular-videos/'), None, None),
+            ('popular-videos-cold', lambda i: anonymous.get('/api/popular-videos/'), lambda i: cache.clear(), None),
+        ]
+
+        routes = {}
+        for name, scenario, before, after in scenarios:
+            routes[name] = self.measure(scenario, before, after, options['requests'], options['warmup'])
+
+        return {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'data': {
+                'users': User.objects.count(),
+                'videos': Video.objects.count(),
+                'categories': len(categories),
+                'likes': Like.objects.count(),
+            },
+            'requests_per_route': options['requests'],
+            'routes': routes,
+            'timing_middleware': self.measure_timing_overhead(
+                options['requests'], options['warmup'], options['timing_rounds'], options['max_timing_overhead'],
+            ),
+        }
+
+    def measure_timing_overhead(self, requests, warmup, rounds, max_percent):
+        # The video list with and without base.timing.TimingMiddleware, so the per-query
+        # execute wrapper and the emitted log line are part of the difference. Each round
+        # compares the two medians; the median over rounds is what the budget is held to,
+        # so one noisy round neither fails the run nor hides a regression.
+        timing_middleware = 'base.timing.TimingMiddleware'
+        with_timing = APIClient()
+        with override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != timing_middleware]):
+            without_timing = APIClient()
+            without_timing.get('/videos/')  # The middleware chain is built on the first request
+
+        logger = logging.getLogger('base.timing')
+        level, handlers = logger.level, logger.handlers
+        with open(os.devnull, 'w') as devnull:
+            logger.setLevel(logging.INFO)
+            logger.handlers = [logging.StreamHandler(devnull)]
+            try:
+                medians = []
+                for _ in range(rounds):
+                    # Interleaved so drift in machine load hits both sides equally, and which
+                    # side goes first alternates so neither always runs on a warmer cache
+                    samples = {'with': [], 'without': []}
+                    pair = [('with', with_timing), ('without', without_timing)]
+                    for i in range(warmup + requests):
+                        for name, client in (pair if i % 2 else pair[::-1]):
+                            start = time.perf_counter()
+                            client.get('/videos/')
+                            if i >= warmup:
+                                samples[name].append(time.perf_counter() - start)
+                    medians.append((percentile(sorted(samples['with']), 50), percentile(sorted(samples['without']), 50)))
+            finally:
+                logger.setLevel(level)
+                logger.handlers = handlers
+
+        round_percents = [(with_s - without_s) / without_s * 100 for with_s, without_s in medians]
+        overhead_percent = statistics.median(round_percents)
+        with_ms = statistics.median(with_s for with_s, _ in medians) * 1000
+        without_ms = statistics.median(without_s for _, without_s in medians) * 1000
+        return {
+            'route': 'video-list',
+            'rounds': rounds,
+            'p50_with_ms': round(with_ms, 3),
+            'p50_without_ms': round(without_ms, 3),
+            'overhead_ms': round(with_ms - without_ms, 3),
+            'overhead_percent': round(overhead_percent, 2),
+            'round_overhead_percents': [round(percent, 2) for percent in round_percents],
+            'max_overhead_percent': max_percent,
+            'within_budget': not max_percent or overhead_percent <= max_percent,
+        }
+
+    def measure(self, scenario, before, after, requests, warmup):
+        latencies = []
+        queries = 0
+        errors = 0
+        for i in range(warmup + requests):
+            if before:
+                before(i)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = scenario(i)
+                elapsed = time.perf_counter() - start
+            # captured reads the connection's query log lazily, and the cleanup request resets it
+            query_count = len(captured)
+            if after:
+                after(i)
+            if i >= warmup:
+                latencies.append(elapsed)
+                queries += query_count
+                errors += response.status_code >= 400
+        return self.summarize(latencies, queries, errors)
+
+    def summarize(self, latencies, queries, errors):
+        # Requests run one after another, so throughput is for a single worker
+        elapsed = sum(latencies)
+        ordered = sorted(latencies)
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+            'queries_per_request': round(queries / len(latencies), 2),
+        }
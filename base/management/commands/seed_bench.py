@@ -0,0 +1,114 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from base import hot
+from base.models import Category, Like, Video
+
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+CATEGORY_NAMES = [
+    "Science", "History", "Technology", "Nature", "Space", "Engineering",
+    "Mathematics", "Art", "Music", "Geography", "Psychology", "Economics",
+]
+
+
+def unused_names(template, taken):
+    # template.format(0), template.format(1), ... skipping names already in the database,
+    # so running the command again without --clear adds data instead of colliding
+    for i in itertools.count():
+        name = template.format(i)
+        if name not in taken:
+            yield name
+
+
+class Command(BaseCommand):
+    help = "Create synthetic users, videos, categories and likes for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--videos', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--likes', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true', help="Delete earlier benchmark data first.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        if options['clear']:
+            # Videos and likes of the bench users go with them through the cascade
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        password = make_password(PASSWORD)  # Hash once, hashing per user would dominate the run
+        usernames = unused_names(
+            USERNAME_PREFIX + '{}',
+            set(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', flat=True)),
+        )
+        users = User.objects.bulk_create(
+            User(username=next(usernames), password=password) for _ in range(options['users'])
+        )
+
+        categories = []
+        for i in range(options['categories']):
+            name = CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Category {i}"
+            categories.append(Category.objects.get_or_create(name=name)[0])
+
+        youtube_ids = unused_names(
+            'bench{:06d}',
+            set(Video.objects.filter(youtube_id__startswith='bench').values_list('youtube_id', flat=True)),
+        )
+        # bulk_create skips Video.save(), so the canonical youtube_id is set here
+        videos = []
+        for i in range(options['videos']):
+            youtube_id = next(youtube_ids)
+            videos.append(Video(
+                link=f"https://www.youtube.com/watch?v={youtube_id}",
+                youtube_id=youtube_id,
+                description=f"Benchmark video {i}",
+                user=rng.choice(users),
+                approved=rng.random() < 0.9,
+                denied=rng.random() < 0.05,
+            ))
+        videos = Video.objects.bulk_create(videos)
+
+        # One or two categories per video, as VideoSerializer.validate_categories allows
+        through = Video.categories.through
+        through.objects.bulk_create(
+            through(video_id=video.id, category_id=category.id)
+            for video in videos
+            for category in rng.sample(categories, rng.randint(1, min(2, len(categories))))
+        )
+
+        # Power-law popularity: a few videos get most of the likes, and a few users do most of the liking
+        video_weights = [rng.paretovariate(1.2) for _ in videos]
+        user_weights = [rng.paretovariate(1.5) for _ in users]
+        max_likes = min(options['likes'], len(users) * len(videos))
+        pairs = set()
+        while len(pairs) < max_likes:
+            batch = max_likes - len(pairs)
+            pairs.update(zip(
+                rng.choices(range(len(users)), weights=user_weights, k=batch),
+                rng.choices(range(len(videos)), weights=video_weights, k=batch),
+            ))
+        Like.objects.bulk_create(
+            (Like(user=users[u], video=videos[v]) for u, v in pairs), batch_size=1000
+        )
+
+        like_counts = [0] * len(videos)
+        for _, v in pairs:
+            like_counts[v] += 1
+        for video, count in zip(videos, like_counts):
+            video.likes = count
+        Video.objects.bulk_update(videos, ['likes'], batch_size=1000)
+        # bulk_create bypasses the like view, so the hot scores are built from the new likes
+        hot.recompute(Video, Like)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(videos)} videos, {len(categories)} categories and {len(pairs)} likes."
+        ))
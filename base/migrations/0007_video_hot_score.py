@@ -0,0 +1,67 @@
+# Generated by Django 5.1.1 on 2026-10-19 17:50
+
+import math
+from datetime import datetime, timezone
+
+import base.hot
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+# Frozen copy of base.hot's scoring and of settings.HOT_HALF_LIFE as of this migration, so
+# later changes to either cannot change what the backfill computes
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = 60 * 60 * 24
+
+
+def event_score(when):
+    return (when - EPOCH).total_seconds() / HALF_LIFE
+
+
+def combine(scores):
+    high = max(scores)
+    return high + math.log2(sum(2 ** (score - high) for score in scores))
+
+
+def compute_hot_scores(apps, schema_editor):
+    # One batch of videos at a time, so neither memory nor a single query grows with the table
+    Video = apps.get_model('base', 'Video')
+    Like = apps.get_model('base', 'Like')
+    last_id = 0
+    while True:
+        batch = list(Video.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'createdTime')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        scores = {video_id: [event_score(created)] for video_id, created in batch}
+        likes = Like.objects.filter(video_id__in=scores).values_list('video_id', 'created_at')
+        for video_id, created in likes.iterator():
+            scores[video_id].append(event_score(created))
+
+        Video.objects.bulk_update(
+            [Video(id=video_id, hot_score=combine(events)) for video_id, events in scores.items()],
+            ['hot_score'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_profilerule_requestprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hot_score',
+            field=models.FloatField(default=base.hot.current_score),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(condition=models.Q(('approved', True), ('denied', False)), fields=['-hot_score'], name='video_visible_hot_idx'),
+        ),
+        migrations.RunPython(compute_hot_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.1 on 2026-10-19 17:53
+
+import re
+from urllib.parse import parse_qs, urlparse
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 500
+
+# Frozen copy of base.youtube.parse_video_id as of this migration, so later changes to the
+# parser cannot change what the backfill does
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+PATH_PREFIXES = {'embed', 'shorts', 'v', 'live'}
+
+
+def parse_video_id(link):
+    if '://' not in link:
+        link = f"https://{link}"
+    url = urlparse(link.strip())
+    host = (url.hostname or '').lower()
+    parts = [part for part in url.path.split('/') if part]
+
+    if host in SHORT_HOSTS:
+        candidate = parts[0] if parts else ''
+    elif host in HOSTS:
+        if parts == ['watch']:
+            candidate = parse_qs(url.query).get('v', [''])[0]
+        elif len(parts) >= 2 and parts[0] in PATH_PREFIXES:
+            candidate = parts[1]
+        else:
+            candidate = ''
+    else:
+        return None
+
+    return candidate if VIDEO_ID.match(candidate) else None
+
+
+def fill_youtube_ids(apps, schema_editor):
+    # Each batch is its own short transaction so a large table is never locked for the whole backfill
+    Video = apps.get_model('base', 'Video')
+    seen = set()
+    last_id = 0
+    while True:
+        batch = list(Video.objects.filter(id__gt=last_id).order_by('id').only('id', 'link')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        for video in batch:
+            video.youtube_id = parse_video_id(video.link)
+            # Earlier submissions of the same video keep the id, later duplicates are left empty
+            if video.youtube_id in seen:
+                print(f"\n  Video {video.id} duplicates {video.youtube_id}, leaving its youtube_id empty")
+                video.youtube_id = None
+            elif video.youtube_id:
+                seen.add(video.youtube_id)
+        with transaction.atomic():
+            Video.objects.bulk_update(batch, ['youtube_id'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('base', '0007_video_hot_score'),
+    ]
+
+    # A nullable column is added with ALTER TABLE and the constraint is a CREATE UNIQUE INDEX,
+    # so unlike unique=True on the field neither step makes SQLite copy the table
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='youtube_id',
+            field=models.CharField(blank=True, editable=False, max_length=11, null=True),
+        ),
+        migrations.RunPython(fill_youtube_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='video',
+            constraint=models.UniqueConstraint(condition=models.Q(('youtube_id__isnull', False)), fields=('youtube_id',), name='video_unique_youtube_id'),
+        ),
+    ]
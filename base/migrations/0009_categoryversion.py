@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model('base', 'CategoryVersion').objects.create(version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_video_youtube_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
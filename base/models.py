@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from . import hot, youtube
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -7,8 +8,14 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class CategoryVersion(models.Model):
+    # A single row bumped on every category change, so each worker's category registry
+    # (base/category_registry.py) notices writes made by other workers
+    version = models.PositiveBigIntegerField(default=0)
+
 class Video(models.Model):
     link = models.URLField(unique=True)
+    youtube_id = models.CharField(max_length=11, null=True, blank=True, editable=False)  # Canonical id parsed from link
     description = models.TextField()
     categories = models.ManyToManyField(Category, related_name='videos')  # Allow multiple categories
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -16,10 +23,48 @@ class Video(models.Model):
     createdTime = models.DateTimeField(auto_now_add=True)
     likes = models.PositiveIntegerField(default=0)
     denied = models.BooleanField(default=False)
+    hot_score = models.FloatField(default=hot.current_score)  # Time-decayed likes, see base/hot.py
+
+    class Meta:
+        indexes = [
+            # Partial index over publicly visible videos, so the top hot ones are read straight off it
+            models.Index(
+                fields=['-hot_score'], condition=models.Q(approved=True, denied=False), name='video_visible_hot_idx'
+            ),
+        ]
+        constraints = [
+            # One video per YouTube id. A partial unique index rather than unique=True, which
+            # SQLite can only add by copying the whole table
+            models.UniqueConstraint(
+                fields=['youtube_id'], condition=models.Q(youtube_id__isnull=False), name='video_unique_youtube_id'
+            ),
+        ]
 
     def __str__(self):
         return self.link
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        video = super().from_db(db, field_names, values)
+        # Remembered so save() only parses the link again when it was changed
+        video._loaded_link = dict(zip(field_names, values)).get('link')
+        return video
+
+    def save(self, *args, **kwargs):
+        # Migration 0008 left later duplicates of a video without a youtube_id, saving them for
+        # anything but a new link (approving, editing the description) must not set it again
+        if self._state.adding or self.link != getattr(self, '_loaded_link', None):
+            self.youtube_id = youtube.parse_video_id(self.link)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'link' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'youtube_id'}
+        super().save(*args, **kwargs)
+        self._loaded_link = self.link
+
+    def compute_hot_score(self):
+        like_times = self.like_set.values_list('created_at', flat=True)
+        return hot.combine([hot.event_score(self.createdTime), *map(hot.event_score, like_times)])
+
 
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -28,3 +73,25 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ('user', 'video')  # Ensure that a user can like a video only once
+
+class ProfileRule(models.Model):
+    route = models.CharField(max_length=200, unique=True)  # URL name, e.g. video-list or recommend_videos
+    sample_rate = models.FloatField(default=1.0)  # Fraction of matching requests to profile
+    enabled = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.route} ({self.sample_rate:.0%})"
+
+class RequestProfile(models.Model):
+    route = models.CharField(max_length=200)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    db_queries = models.PositiveIntegerField()
+    stats = models.BinaryField()  # Marshalled cProfile stats, same format as Profile.dump_stats
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,157 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ProfileRule, RequestProfile
+
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'  # Sent by clients as X-Profile-Token
+TOKEN_SALT = 'base.profiling'
+RULES_CACHE_KEY = 'profiling:rules'
+
+
+def make_token(user):
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def read_token(token):
+    # Returns the id of the staff user that issued the token, or None if it is invalid
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE)['user']
+    except signing.BadSignature:
+        return None
+
+
+@receiver([post_save, post_delete], sender=ProfileRule)
+def invalidate_rules(**kwargs):
+    cache.delete(RULES_CACHE_KEY)
+
+
+def load_rules():
+    # Cached for PROFILE_RULES_REFRESH seconds, so a rule change reaches every worker within
+    # that time even when the cache is per process and the delete above only hits one of them
+    rules = cache.get(RULES_CACHE_KEY)
+    if rules is None:
+        rules = dict(ProfileRule.objects.filter(enabled=True).values_list('route', 'sample_rate'))
+        cache.set(RULES_CACHE_KEY, rules, settings.PROFILE_RULES_REFRESH)
+    return rules
+
+
+def prune(route=None, keep=None, older_than=None):
+    # Deletes profiles beyond the newest `keep` per route and those created before `older_than`
+    profiles = RequestProfile.objects.all()
+    if route is not None:
+        profiles = profiles.filter(route=route)
+    deleted = 0
+    if older_than is not None:
+        deleted += profiles.filter(created_at__lt=older_than).delete()[0]
+    if keep is not None:
+        routes = [route] if route is not None else profiles.values_list('route', flat=True).distinct()
+        for name in list(routes):
+            stale = list(RequestProfile.objects.filter(route=name).order_by('-id').values_list('id', flat=True)[keep:])
+            if stale:
+                deleted += RequestProfile.objects.filter(id__in=stale).delete()[0]
+    return deleted
+
+
+def stats_report(data, sort='cumulative', limit=60):
+    # Text report of stored stats, like `python -m pstats` would print
+    class LoadedStats:
+        stats = marshal.loads(data)
+
+        def create_stats(self):
+            pass
+
+    stream = io.StringIO()
+    pstats.Stats(LoadedStats(), stream=stream).sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Runs a view under cProfile when the request carries a valid X-Profile-Token
+    or its route matches an enabled ProfileRule and wins the sampling draw, and
+    stores the stats with the route, query count and timing. Everything else
+    only pays for a header lookup and a dict lookup. Only the newest
+    PROFILE_KEEP_PER_ROUTE profiles of a route are kept.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = {}
+        self.rules_loaded_at = None
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        user_id = None
+        token = request.META.get(TOKEN_HEADER)
+        if token:
+            user_id = read_token(token)
+            if user_id is None:
+                return None
+        else:
+            sample_rate = self.get_rules().get(request.resolver_match.view_name)
+            if sample_rate is None or random.random() >= sample_rate:
+                return None
+
+        return self.profile_view(request, view_func, view_args, view_kwargs, user_id)
+
+    def get_rules(self):
+        # Rules are re-read from the cache at most every PROFILE_RULES_REFRESH seconds, so a
+        # change takes effect within twice that
+        now = time.monotonic()
+        if self.rules_loaded_at is None or now - self.rules_loaded_at >= settings.PROFILE_RULES_REFRESH:
+            self.rules = load_rules()
+            self.rules_loaded_at = now
+        return self.rules
+
+    def profile_view(self, request, view_func, view_args, view_kwargs, user_id):
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def run_view():
+            response = view_func(request, *view_args, **view_kwargs)
+            # Render inside the profile so serialization shows up in the stats
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            return response
+
+        wrappers = [conn.execute_wrappers for conn in connections.all()]
+        for execute_wrappers in wrappers:
+            execute_wrappers.append(count_queries)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            response = profiler.runcall(run_view)
+        finally:
+            duration = time.perf_counter() - start
+            for execute_wrappers in wrappers:
+                execute_wrappers.remove(count_queries)
+
+        profiler.create_stats()
+        RequestProfile.objects.create(
+            route=request.resolver_match.view_name,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            status_code=response.status_code,
+            duration_ms=duration * 1000,
+            db_queries=len(queries),
+            stats=marshal.dumps(profiler.stats),
+            user_id=user_id,
+        )
+        prune(route=request.resolver_match.view_name, keep=settings.PROFILE_KEEP_PER_ROUTE)
+        return response
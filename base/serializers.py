@@ -1,15 +1,49 @@
-import re
+from django.db.models import QuerySet
 from rest_framework import serializers
-from .models import Video, Category, User
+from . import category_registry, youtube
+from .models import Video, Category, User, RequestProfile
+from .timing import track
 
-class VideoSerializer(serializers.ModelSerializer):
-    user = serializers.CharField(source='user.username', read_only=True)
-    categories = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), many=True)  # Handle multiple categories
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        # Run the query and its prefetches first so their time counts as db, not serializer
+        if isinstance(self.instance, QuerySet):
+            len(self.instance)
+        with track('serializer'):
+            return super().data
+
+class TimedSerializer(serializers.ModelSerializer):
+    # Reports the time spent building response data to the timing middleware
+    @property
+    def data(self):
+        with track('serializer'):
+            return super().data
 
     class Meta:
+        list_serializer_class = TimedListSerializer
+
+class CategoryIdField(serializers.PrimaryKeyRelatedField):
+    # Validates ids against the in-memory category registry instead of querying Category
+    def to_internal_value(self, data):
+        # Parsed like IntegerField: "2" and 2.0 are accepted, 1.9 and True are not
+        try:
+            pk = int(serializers.IntegerField.re_decimal.sub('', str(data)))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if not category_registry.exists(pk):
+            self.fail('does_not_exist', pk_value=data)
+        return pk
+
+class VideoSerializer(TimedSerializer):
+    user = serializers.CharField(source='user.username', read_only=True)
+    categories = CategoryIdField(queryset=Category.objects.all(), many=True)  # Handle multiple categories
+    liked_by_me = serializers.BooleanField(read_only=True)  # Annotated by the views, false for anonymous users
+
+    class Meta(TimedSerializer.Meta):
         model = Video
-        fields = ['id', 'link', 'description', 'categories', 'user', 'approved', 'denied', 'createdTime', 'likes']
-        read_only_fields = ['id', 'createdTime', 'likes', 'approved', 'user']  # user is set server-side
+        fields = ['id', 'link', 'youtube_id', 'description', 'categories', 'user', 'approved', 'denied', 'createdTime', 'likes', 'liked_by_me']
+        read_only_fields = ['id', 'youtube_id', 'createdTime', 'likes', 'approved', 'user', 'liked_by_me']  # user is set server-side
 
     def validate_categories(self, value):
         # Ensure that a video has 1 or 2 categories (adjust the logic if you need more specific validation)
@@ -18,20 +52,24 @@ class VideoSerializer(serializers.ModelSerializer):
         return value
 
     def validate_link(self, value):
-        youtube_regex = r'^(https?\:\/\/)?(www\.youtube\.com|youtu\.?be)\/.+$'
-        if not re.match(youtube_regex, value):
+        video_id = youtube.parse_video_id(value)
+        if not video_id:
             raise serializers.ValidationError("This is not a valid YouTube link.")
-        if Video.objects.filter(link=value).exists():
+        # Compare canonical ids so youtu.be, m.youtube.com and &t= variants count as the same video
+        duplicates = Video.objects.filter(youtube_id=video_id)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
             raise serializers.ValidationError("This video link has already been submitted.")
         return value
 
-class CategorySerializer(serializers.ModelSerializer):
-    class Meta:
+class CategorySerializer(TimedSerializer):
+    class Meta(TimedSerializer.Meta):
         model = Category
         fields = ['id', 'name']
 
-class UserSerializer(serializers.ModelSerializer):
-    class Meta:
+class UserSerializer(TimedSerializer):
+    class Meta(TimedSerializer.Meta):
         model = User
         fields = ['username', 'password', 'email']
 
@@ -40,3 +78,10 @@ class UserSerializer(serializers.ModelSerializer):
         user.set_password(validated_data['password'])  # Hash the password
         user.save()
         return user
+
+class RequestProfileSerializer(TimedSerializer):
+    user = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta(TimedSerializer.Meta):
+        model = RequestProfile
+        fields = ['id', 'route', 'method', 'path', 'status_code', 'duration_ms', 'db_queries', 'user', 'created_at']
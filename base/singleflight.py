@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# How often a worker polls the shared cache while another worker holds the lock
+POLL_INTERVAL = 0.05
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def make_key(endpoint, params=None, user=None):
+    # Normalize query params so ?a=1&b=2 and ?b=2&a=1 share one computation
+    parts = []
+    if params:
+        for name in sorted(params.keys()):
+            values = params.getlist(name) if hasattr(params, 'getlist') else [params[name]]
+            parts.append(f"{name}={','.join(sorted(str(v) for v in values))}")
+    if user is not None:
+        parts.append(f"user={user}")
+    digest = hashlib.md5('&'.join(parts).encode()).hexdigest()
+    return f"singleflight:{endpoint}:{digest}"
+
+
+def forget(key):
+    cache.delete(key)
+
+
+def coalesce(key, compute, ttl, stale_ttl=0, should_cache=None, lock_timeout=60):
+    """
+    Return the cached result for `key`, or run `compute()` exactly once across all
+    concurrent callers (threads in this process and, through the cache lock, other
+    workers) and share its result.
+
+    Results stay fresh for `ttl` seconds. For `stale_ttl` seconds after that the old
+    result is still served while a single background refresh runs.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() >= fresh_until:
+            _refresh_in_background(key, compute, ttl, stale_ttl, should_cache, lock_timeout)
+        return value
+
+    return _run_once(key, compute, ttl, stale_ttl, should_cache, lock_timeout)
+
+
+def _run_once(key, compute, ttl, stale_ttl, should_cache, lock_timeout):
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+
+    # Followers in this process wait for the leader instead of repeating the work
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    try:
+        call.value = _compute_across_workers(key, compute, ttl, stale_ttl, should_cache, lock_timeout)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+    return call.value
+
+
+def _compute_across_workers(key, compute, ttl, stale_ttl, should_cache, lock_timeout):
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    deadline = time.time() + lock_timeout
+
+    # Another worker holds the lock: pick up its result once it lands in the cache
+    while not cache.add(lock_key, token, lock_timeout):
+        entry = cache.get(key)
+        if entry is not None and time.time() < entry[1]:
+            return entry[0]
+        if time.time() >= deadline:
+            # The lock holder is gone or stuck, compute without the lock
+            token = None
+            break
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        value = compute()
+        if should_cache is None or should_cache(value):
+            cache.set(key, (value, time.time() + ttl), ttl + stale_ttl)
+        return value
+    finally:
+        if token is not None and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _refresh_in_background(key, compute, ttl, stale_ttl, should_cache, lock_timeout):
+    with _inflight_lock:
+        if key in _inflight:
+            return
+
+    def refresh():
+        try:
+            _run_once(key, compute, ttl, stale_ttl, should_cache, lock_timeout)
+        except Exception:
+            logger.exception("Background refresh of %s failed", key)
+        finally:
+            # The thread opened its own database connection
+            connection.close()
+
+    threading.Thread(target=refresh, daemon=True).start()
@@ -1,3 +1,800 @@
-from django.test import TestCase
+import itertools
+import json
+import marshal
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from myproj import database
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import category_registry, checks, profiling, singleflight, timing, trending, youtube
+from .management.commands.bench_startup import parse_importtime
+from .management.commands.run_bench import YouTubeStub, huggingface_stub
+from .models import Category, CategoryVersion, Like, ProfileRule, RequestProfile, Video
+from .trending import fetch_popular_educational_videos
+from .views import get_popular_educational_videos
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def run_concurrently(self, func, callers=20):
+        barrier = threading.Barrier(callers)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(func())
+
+        threads = [threading.Thread(target=worker) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_callers_share_one_computation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"videos": [1, 2, 3]}
+
+        key = singleflight.make_key('popular-videos')
+        results = self.run_concurrently(lambda: singleflight.coalesce(key, compute, ttl=60))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"videos": [1, 2, 3]}] * 20)
+
+    def test_key_ignores_param_order(self):
+        self.assertEqual(
+            singleflight.make_key('videos', {'a': '1', 'b': '2'}),
+            singleflight.make_key('videos', {'b': '2', 'a': '1'}),
+        )
+        self.assertNotEqual(
+            singleflight.make_key('videos', user=1),
+            singleflight.make_key('videos', user=2),
+        )
+
+    def test_stale_value_is_served_while_refreshing(self):
+        key = singleflight.make_key('popular-videos')
+        cache.set(key, ("old", time.time() - 1), 60)
+        refreshed = threading.Event()
+
+        def compute():
+            refreshed.set()
+            return "new"
+
+        self.assertEqual(singleflight.coalesce(key, compute, ttl=60, stale_ttl=60), "old")
+        self.assertTrue(refreshed.wait(5))
+        for _ in range(100):
+            if cache.get(key)[0] == "new":
+                break
+            time.sleep(0.01)
+        self.assertEqual(singleflight.coalesce(key, compute, ttl=60), "new")
+
+    def test_failed_background_refresh_is_logged(self):
+        key = singleflight.make_key('popular-videos')
+        cache.set(key, ("old", time.time() - 1), 60)
+        failed = threading.Event()
+
+        def compute():
+            failed.set()
+            raise RuntimeError("upstream down")
+
+        with self.assertLogs('base.singleflight', 'ERROR') as logs:
+            self.assertEqual(singleflight.coalesce(key, compute, ttl=60, stale_ttl=60), "old")
+            self.assertTrue(failed.wait(5))
+            for _ in range(100):
+                if logs.output:
+                    break
+                time.sleep(0.01)
+        self.assertIn("upstream down", logs.output[0])
+
+    def test_waits_for_result_from_other_worker(self):
+        key = singleflight.make_key('popular-videos')
+        # Simulate another worker holding the lock and publishing its result
+        cache.add(f"{key}:lock", "other-worker", 60)
+        threading.Timer(0.1, lambda: cache.set(key, ("shared", time.time() + 60), 60)).start()
+
+        compute = mock.Mock(return_value="mine")
+        self.assertEqual(singleflight.coalesce(key, compute, ttl=60), "shared")
+        compute.assert_not_called()
+
+    def test_errors_are_not_cached(self):
+        key = singleflight.make_key('popular-videos')
+        compute = mock.Mock(side_effect=[({"error": "boom"}, 500), ({"videos": []}, 200)])
+        should_cache = lambda result: result[1] == 200
+
+        self.assertEqual(singleflight.coalesce(key, compute, ttl=60, should_cache=should_cache)[1], 500)
+        self.assertEqual(singleflight.coalesce(key, compute, ttl=60, should_cache=should_cache)[1], 200)
+        self.assertEqual(compute.call_count, 2)
+
+    @mock.patch('base.trending.youtube_client')
+    def test_popular_videos_fetched_once_for_concurrent_requests(self, youtube_client):
+        def execute():
+            time.sleep(0.1)
+            return {"items": []}
+
+        execute_mock = youtube_client.return_value.videos.return_value.list.return_value.execute
+        execute_mock.side_effect = execute
+        factory = APIRequestFactory()
+        query_strings = itertools.count()
+
+        # Every caller sends a different query string, which must not bypass the shared fetch
+        responses = self.run_concurrently(
+            lambda: get_popular_educational_videos(factory.get('/api/popular-videos/', {'x': next(query_strings)}))
+        )
+
+        # One fetch asks YouTube once for each of its three trending categories
+        self.assertEqual(execute_mock.call_count, 3)
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+
+
+class TimingMiddlewareTests(TestCase):
+    def setUp(self):
+        for i in range(20):
+            Category.objects.create(name=f"Category {i}")
+        # Warm the worker so one-off loads do not show up in the numbers
+        self.client.get('/categories/')
+        timing.reset_metrics()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/categories/')
+
+        header = response['Server-Timing']
+        for phase in timing.PHASES:
+            self.assertIn(f"{phase};dur=", header)
+        self.assertIn('db;dur=', header)
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="1 queries"')
+
+    def test_logs_structured_line(self):
+        with self.assertLogs('base.timing', level='INFO') as logs:
+            self.client.get('/categories/')
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'category-list')
+        self.assertEqual(line['db_queries'], 1)
+        self.assertEqual(line['status'], 200)
+
+    def test_metrics_endpoint_exposes_route_histograms(self):
+        self.client.get('/categories/')
+        self.client.get('/categories/')
+
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('request_phase_seconds_count{route="category-list",phase="total"} 2', body)
+        self.assertIn('request_db_queries_total{route="category-list"} 2', body)
+
+    def test_metrics_endpoint_rejects_other_addresses(self):
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(PROFILE_RULES_REFRESH=0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='staff', is_staff=True)
+        self.client = APIClient()
+        Category.objects.create(name="Science")
+        cache.clear()
+
+    def tearDown(self):
+        # Cached rules outlive the rolled back test transaction
+        cache.clear()
+
+    def get_token(self):
+        self.client.force_authenticate(self.staff)
+        token = self.client.post('/api/profile-token/').data['token']
+        self.client.force_authenticate(None)
+        return token
+
+    def test_signed_header_profiles_request(self):
+        self.client.get('/categories/', HTTP_X_PROFILE_TOKEN=self.get_token())
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.route, 'category-list')
+        self.assertEqual(profile.db_queries, 1)
+        self.assertEqual(profile.user, self.staff)
+        self.assertGreater(profile.duration_ms, 0)
+
+    def test_invalid_token_is_ignored(self):
+        self.client.get('/categories/', HTTP_X_PROFILE_TOKEN='forged')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_route_rule_sampling(self):
+        rule = ProfileRule.objects.create(route='category-list', sample_rate=0)
+        self.client.get('/categories/')
+        self.assertFalse(RequestProfile.objects.exists())
+
+        rule.sample_rate = 1
+        rule.save()
+        self.client.get('/categories/')
+        self.client.get('/videos/')
+        self.assertEqual(list(RequestProfile.objects.values_list('route', flat=True)), ['category-list'])
+
+    @override_settings(PROFILE_RULES_REFRESH=30)
+    def test_rule_changes_reach_other_workers_after_refresh(self):
+        ProfileRule.objects.create(route='category-list', sample_rate=1)
+        self.assertEqual(profiling.load_rules(), {'category-list': 1})
+
+        # Disabled by another worker: its signal cleared a cache this process does not share
+        ProfileRule.objects.update(enabled=False)
+        self.assertEqual(profiling.load_rules(), {'category-list': 1})
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 31):
+            self.assertEqual(profiling.load_rules(), {})
+
+    @override_settings(PROFILE_KEEP_PER_ROUTE=2)
+    def test_only_newest_profiles_per_route_are_kept(self):
+        ProfileRule.objects.create(route='category-list', sample_rate=1)
+        for _ in range(4):
+            self.client.get('/categories/')
+        self.client.get('/videos/', HTTP_X_PROFILE_TOKEN=self.get_token())
+
+        self.assertEqual(RequestProfile.objects.filter(route='category-list').count(), 2)
+        self.assertEqual(RequestProfile.objects.filter(route='video-list').count(), 1)
+
+    def test_prune_command_deletes_old_profiles(self):
+        token = self.get_token()
+        self.client.get('/categories/', HTTP_X_PROFILE_TOKEN=token)
+        self.client.get('/videos/', HTTP_X_PROFILE_TOKEN=token)
+        RequestProfile.objects.filter(route='video-list').update(created_at=timezone.now() - timedelta(days=8))
+
+        call_command('prune_profiles', days=7, stdout=StringIO())
+        self.assertEqual(list(RequestProfile.objects.values_list('route', flat=True)), ['category-list'])
+
+    def test_staff_can_list_and_download_profiles(self):
+        self.client.get('/categories/', HTTP_X_PROFILE_TOKEN=self.get_token())
+        profile = RequestProfile.objects.get()
+
+        self.assertEqual(self.client.get('/profiles/').status_code, 401)
+
+        self.client.force_authenticate(self.staff)
+        listing = self.client.get('/profiles/', {'route': 'category-list'})
+        self.assertEqual([item['id'] for item in listing.data], [profile.id])
+
+        raw = self.client.get(f'/profiles/{profile.id}/download/')
+        self.assertIsInstance(marshal.loads(raw.content), dict)
+        report = self.client.get(f'/profiles/{profile.id}/download/', {'as': 'text'})
+        self.assertIn('function calls', report.content.decode())
+
+
+class BenchmarkCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_bench_respects_model_rules(self):
+        call_command('seed_bench', users=20, videos=50, categories=5, likes=300, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='bench_').count(), 20)
+        self.assertEqual(Like.objects.count(), 300)
+        for video in Video.objects.annotate(category_count=Count('categories', distinct=True), like_count=Count('like', distinct=True)):
+            self.assertIn(video.category_count, (1, 2))
+            self.assertEqual(video.likes, video.like_count)
+            self.assertAlmostEqual(video.hot_score, video.compute_hot_score(), places=6)
+
+    def test_seed_bench_can_run_again_without_clear(self):
+        call_command('seed_bench', users=5, videos=10, categories=3, likes=20, stdout=StringIO())
+        Video.objects.filter(id=Video.objects.order_by('id').first().id).delete()
+        call_command('seed_bench', users=5, videos=10, categories=3, likes=20, seed=2, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='bench_').count(), 10)
+        self.assertEqual(Video.objects.count(), 19)
+
+    def test_run_bench_requires_seeded_data(self):
+        with self.assertRaisesMessage(CommandError, "seed_bench"):
+            call_command('run_bench', use_existing_db=True, requests=1, warmup=0, stdout=StringIO())
+
+    def test_run_bench_reports_every_route(self):
+        call_command('seed_bench', users=5, videos=10, categories=3, likes=20, stdout=StringIO())
+        out = StringIO()
+        # Three requests are too few for the overhead budget to mean anything
+        call_command(
+            'run_bench', use_existing_db=True, requests=3, warmup=0, timing_rounds=2, max_timing_overhead=0, stdout=out,
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['data']['videos'], 10)
+        self.assertIn('toggle-admin', report['routes'])
+        self.assertIn('toggle-active', report['routes'])
+        for name, route in report['routes'].items():
+            self.assertEqual(route['requests'], 3, name)
+            self.assertEqual(route['errors'], 0, name)
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+                self.assertIn(key, route)
+        # Routes with setup or cleanup requests still count the queries of the timed one
+        for name in ('video-like', 'video-unlike', 'toggle-admin', 'toggle-active'):
+            self.assertGreater(report['routes'][name]['queries_per_request'], 0, name)
+        for key in ('p50_with_ms', 'p50_without_ms', 'overhead_percent'):
+            self.assertIn(key, report['timing_middleware'])
+        self.assertEqual(len(report['timing_middleware']['round_overhead_percents']), 2)
+        self.assertTrue(report['timing_middleware']['within_budget'])
+
+    def test_run_bench_fails_over_timing_overhead_budget(self):
+        call_command('seed_bench', users=5, videos=10, categories=3, likes=20, stdout=StringIO())
+        out = StringIO()
+        # A middleware that got 5ms slower
+        real_call = timing.TimingMiddleware.__call__
+
+        def slower_call(middleware, request):
+            time.sleep(0.005)
+            return real_call(middleware, request)
+
+        with mock.patch('base.management.commands.run_bench.Command.measure', return_value={}), \
+                mock.patch.object(timing.TimingMiddleware, '__call__', slower_call), \
+                self.assertRaisesMessage(CommandError, "budget"):
+            call_command('run_bench', use_existing_db=True, requests=5, warmup=0, stdout=out)
+
+        self.assertFalse(json.loads(out.getvalue())['timing_middleware']['within_budget'])
+
+
+class LikedByMeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer', password='viewer')
+        self.uploader = User.objects.create_user('uploader', password='uploader')
+        self.categories = [Category.objects.create(name=name) for name in ("Science", "History", "Art")]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_videos(self, count):
+        start = Video.objects.count()
+        for i in range(start, start + count):
+            video = Video.objects.create(
+                link=f"https://www.youtube.com/watch?v={i}", description="", user=self.uploader, approved=True
+            )
+            video.categories.set(self.categories[i % 3:i % 3 + 2])
+            if i % 2:
+                Like.objects.create(user=self.user, video=video)
+
+    def test_list_flags_liked_videos(self):
+        self.add_videos(4)
+
+        response = self.client.get('/videos/')
+        liked = set(Like.objects.filter(user=self.user).values_list('video_id', flat=True))
+        self.assertEqual({video['id']: video['liked_by_me'] for video in response.data},
+                         {video['id']: video['id'] in liked for video in response.data})
+
+    def test_retrieve_includes_flag(self):
+        self.add_videos(2)
+        video = Like.objects.filter(user=self.user).first().video
+
+        self.assertTrue(self.client.get(f'/videos/{video.id}/').data['liked_by_me'])
+
+    def test_created_video_includes_flag(self):
+        response = self.client.post('/videos/', {
+            'link': "https://youtu.be/dQw4w9WgXcQ", 'description': "A video", 'categories': [self.categories[0].id],
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIs(response.data['liked_by_me'], False)
+
+    def test_anonymous_users_get_false(self):
+        self.add_videos(2)
+
+        response = APIClient().get('/videos/')
+        self.assertFalse(any(video['liked_by_me'] for video in response.data))
+
+    def test_query_count_is_flat_across_page_sizes(self):
+        self.add_videos(3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/videos/')
+
+        self.add_videos(30)
+        with self.assertNumQueries(len(small)):
+            response = self.client.get('/videos/')
+        self.assertEqual(len(response.data), 33)
+
+        for url in ('/api/liked-videos/', '/api/user-videos/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertLessEqual(len(queries), len(small), url)
+
+
+class HotScoreTests(TestCase):
+    def setUp(self):
+        self.uploader = User.objects.create(username='uploader')
+        self.users = [User.objects.create(username=f'fan{i}') for i in range(3)]
+        self.client = APIClient()
+
+    def add_video(self, number, likes=0, days_ago=0):
+        video = Video.objects.create(
+            link=f"https://www.youtube.com/watch?v={number}", description="", user=self.uploader, approved=True
+        )
+        when = timezone.now() - timedelta(days=days_ago)
+        Video.objects.filter(pk=video.pk).update(createdTime=when)
+        for user in self.users[:likes]:
+            Like.objects.filter(pk=Like.objects.create(user=user, video=video).pk).update(created_at=when)
+        return video
+
+    def test_like_and_unlike_update_score_incrementally(self):
+        video = self.add_video(1)
+        call_command('refresh_hot_scores', stdout=StringIO())
+        self.client.force_authenticate(self.users[0])
+
+        self.client.post(f'/videos/{video.id}/like/')
+        video.refresh_from_db()
+        self.assertAlmostEqual(video.hot_score, video.compute_hot_score(), places=6)
+
+        self.client.delete(f'/videos/{video.id}/unlike/')
+        video.refresh_from_db()
+        self.assertAlmostEqual(video.hot_score, video.compute_hot_score(), places=6)
+
+    def test_recent_likes_outrank_old_ones(self):
+        old = self.add_video(1, likes=3, days_ago=10)
+        new = self.add_video(2, likes=1)
+        call_command('refresh_hot_scores', stdout=StringIO())
+
+        response = self.client.get('/videos/', {'ordering': 'hot'})
+        self.assertEqual([video['id'] for video in response.data], [new.id, old.id])
+
+    def test_like_and_unlike_adjust_counts_in_sql(self):
+        video = self.add_video(1, likes=2)
+        # Likes counted by other requests after this instance was loaded
+        Video.objects.filter(pk=video.pk).update(likes=5)
+        self.client.force_authenticate(self.users[2])
+
+        self.client.post(f'/videos/{video.id}/like/')
+        self.assertEqual(Video.objects.get(pk=video.pk).likes, 6)
+
+        self.client.force_authenticate(self.users[0])
+        with CaptureQueriesContext(connection) as captured:
+            self.client.delete(f'/videos/{video.id}/unlike/')
+        self.assertEqual(Video.objects.get(pk=video.pk).likes, 5)
+
+        # Only the user's own like is read, not every like of the video
+        like_reads = [q['sql'] for q in captured if q['sql'].startswith('SELECT') and '"base_like"' in q['sql']]
+        self.assertTrue(all('"user_id" =' in sql for sql in like_reads), like_reads)
+
+    def hot_list_query(self, client):
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get('/videos/', {'ordering': 'hot'})
+        main = [q['sql'] for q in captured if 'ORDER BY "base_video"."hot_score" DESC' in q['sql']]
+        self.assertEqual(len(main), 1)
+        return response, main[0]
+
+    @override_settings(HOT_VIDEOS_LIMIT=5)
+    def test_hot_list_returns_top_k_from_index(self):
+        for i in range(8):
+            self.add_video(i, likes=i % 4, days_ago=i)
+        call_command('refresh_hot_scores', stdout=StringIO())
+        self.client.force_authenticate(self.users[0])
+
+        response, sql = self.hot_list_query(self.client)
+
+        expected = Video.objects.order_by('-hot_score', '-id').values_list('id', flat=True)[:5]
+        self.assertEqual([video['id'] for video in response.data], list(expected))
+        self.assertIn('LIMIT 5', sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('video_visible_hot_idx', plan)
+        self.assertNotIn('SCAN U0', plan)  # liked_by_me is an index lookup per returned row
+
+    def test_hot_list_query_does_not_grow_with_likes(self):
+        videos = [self.add_video(i) for i in range(20)]
+        self.client.force_authenticate(self.users[0])
+        _, before = self.hot_list_query(self.client)
+
+        fans = User.objects.bulk_create(User(username=f'bulk{i}') for i in range(200))
+        Like.objects.bulk_create(Like(user=fan, video=video) for fan in fans for video in videos)
+        with self.assertNumQueries(2):  # The video page and the categories prefetch
+            _, after = self.hot_list_query(self.client)
+
+        self.assertEqual(before, after)
+
+
+class YouTubeIdTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='submitter')
+        self.category = Category.objects.create(name="Science")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, link):
+        return self.client.post('/videos/', {'link': link, 'description': "A video", 'categories': [self.category.id]})
+
+    def test_parse_video_id_variants(self):
+        for link in [
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+            "https://youtube.com/watch?v=dQw4w9WgXcQ&t=10",
+            "https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+            "https://youtu.be/dQw4w9WgXcQ?si=abc",
+            "youtu.be/dQw4w9WgXcQ",
+            "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+            "https://www.youtube.com/embed/dQw4w9WgXcQ",
+        ]:
+            self.assertEqual(youtube.parse_video_id(link), "dQw4w9WgXcQ", link)
+        for link in ["https://vimeo.com/12345", "https://www.youtube.com/watch?v=short", "https://www.youtube.com/"]:
+            self.assertIsNone(youtube.parse_video_id(link), link)
+
+    def test_submission_stores_canonical_id(self):
+        response = self.submit("https://youtu.be/dQw4w9WgXcQ")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['youtube_id'], "dQw4w9WgXcQ")
+        self.assertEqual(Video.objects.get().youtube_id, "dQw4w9WgXcQ")
+
+    def test_link_variants_are_duplicates(self):
+        self.submit("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+
+        for link in ["https://youtu.be/dQw4w9WgXcQ", "https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=10"]:
+            response = self.submit(link)
+            self.assertEqual(response.status_code, 400, link)
+            self.assertIn('link', response.data)
+        self.assertEqual(Video.objects.count(), 1)
+
+    def test_invalid_link_is_rejected(self):
+        response = self.submit("https://vimeo.com/12345")
+        self.assertEqual(response.status_code, 400)
+
+    def test_legacy_duplicates_can_still_be_saved(self):
+        self.submit("https://youtu.be/dQw4w9WgXcQ")
+        # What migration 0008 leaves for a later submission of the same video
+        legacy = Video.objects.bulk_create([Video(
+            link="https://www.youtube.com/watch?v=dQw4w9WgXcQ", youtube_id=None, description="", user=self.user,
+        )])[0]
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+
+        response = self.client.patch(f'/videos/{legacy.id}/', {'approved': True})
+        self.assertEqual(response.status_code, 200)
+        legacy.refresh_from_db()
+        self.assertTrue(legacy.approved)
+        self.assertIsNone(legacy.youtube_id)
+
+        legacy.link = "https://youtu.be/aaaaaaaaaaa"
+        legacy.save()
+        self.assertEqual(Video.objects.get(pk=legacy.pk).youtube_id, "aaaaaaaaaaa")
+
+
+class YouTubeIdMigrationTests(TransactionTestCase):
+    # sqlmigrate needs the SQLite schema editor, which cannot run inside TestCase's transaction
+    def test_migration_does_not_rebuild_video_table(self):
+        out = StringIO()
+        call_command('sqlmigrate', 'base', '0008', stdout=out)
+        self.assertNotIn('new__base_video', out.getvalue())
+        self.assertIn('CREATE UNIQUE INDEX "video_unique_youtube_id"', out.getvalue())
+
+
+class CategoryRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.categories = [Category.objects.create(name=name) for name in ("Science", "History", "Art")]
+        self.user = User.objects.create(username='viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category_registry.names()  # Warm the registry like a running worker
+
+    def category_queries(self, captured):
+        # Lookups on the Category table itself; reading a video's own categories through the
+        # join table (m2m set() and response rendering) is not what the registry replaces
+        return [
+            query['sql'] for query in captured
+            if '"base_category"' in query['sql'] and '"base_video_categories"' not in query['sql']
+        ]
+
+    @mock.patch('base.trending.http_session', return_value=mock.Mock(post=huggingface_stub))
+    @mock.patch('base.trending.youtube_client', return_value=YouTubeStub())
+    def test_trending_uses_registry(self, youtube_client, http_session):
+        with CaptureQueriesContext(connection) as captured:
+            data, status_code = fetch_popular_educational_videos()
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual({video['categoryId'] for video in data['videos']}, {self.categories[0].id})
+        self.assertEqual(self.category_queries(captured), [])
+
+    def test_recommend_uses_registry(self):
+        uploader = User.objects.create(username='uploader')
+        for i in range(4):
+            video = Video.objects.create(link=f"https://youtu.be/video{i:06d}", description="", user=uploader, approved=True)
+            video.categories.set([self.categories[1]])
+            if i < 2:
+                Like.objects.create(user=self.user, video=video)
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/recommend-videos/')
+
+        self.assertEqual(response.data['favorite_category'], "History")
+        self.assertEqual(len(response.data['recommended_videos']), 2)
+        self.assertEqual(self.category_queries(captured), [])
+
+    def test_like_clears_cached_recommendations_for_any_query_string(self):
+        uploader = User.objects.create(username='uploader')
+        videos = []
+        for i in range(3):
+            video = Video.objects.create(link=f"https://youtu.be/video{i:06d}", description="", user=uploader, approved=True)
+            video.categories.set([self.categories[1]])
+            videos.append(video)
+        Like.objects.create(user=self.user, video=videos[0])
+
+        response = self.client.get('/api/recommend-videos/?page=2')
+        self.assertEqual(len(response.data['recommended_videos']), 2)
+
+        self.client.post(f'/videos/{videos[1].id}/like/')
+        response = self.client.get('/api/recommend-videos/?page=2')
+        self.assertEqual([video['id'] for video in response.data['recommended_videos']], [videos[2].id])
+
+    def test_video_submission_validates_against_registry(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/videos/', {
+                'link': "https://youtu.be/dQw4w9WgXcQ", 'description': "A video",
+                'categories': [self.categories[0].id, self.categories[2].id],
+            })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.category_queries(captured), [])
+
+        response = self.client.post('/videos/', {
+            'link': "https://youtu.be/aaaaaaaaaaa", 'description': "A video", 'categories': [999],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('categories', response.data)
+
+    def test_category_writes_invalidate_registry(self):
+        response = self.client.post('/categories/', {'name': "Space"})
+        self.assertEqual(category_registry.id_for("Space"), response.data['id'])
+
+        self.client.delete(f"/categories/{response.data['id']}/")
+        self.assertIsNone(category_registry.id_for("Space"))
+
+    @override_settings(CATEGORY_REGISTRY_CHECK_INTERVAL=0)
+    def test_reloads_when_another_worker_bumps_version(self):
+        # Simulate a write from another worker: no signal here, only the version row changes
+        Category.objects.bulk_create([Category(name="Music")])
+        self.assertIsNone(category_registry.id_for("Music"))
+
+        CategoryVersion.objects.update(version=F('version') + 1)
+        self.assertIsNotNone(category_registry.id_for("Music"))
+
+    def test_non_integral_category_ids_are_rejected(self):
+        for value in (1.9, "1.5", True):
+            response = self.client.post('/videos/', {
+                'link': "https://youtu.be/dQw4w9WgXcQ", 'description': "A video", 'categories': [value],
+            }, format='json')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('categories', response.data)
+
+        response = self.client.post('/videos/', {
+            'link': "https://youtu.be/dQw4w9WgXcQ", 'description': "A video",
+            'categories': [float(self.categories[0].id)],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class DatabaseLayerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = database.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias_during(self, request):
+        aliases = []
+
+        def view(request):
+            aliases.append(self.router.db_for_read(Video))
+            if request.method == 'POST':
+                self.router.db_for_write(Like)
+                aliases.append(self.router.db_for_read(Video))
+            return HttpResponse()
+
+        database.ReadYourWritesMiddleware(view)(request)
+        return aliases
+
+    def test_django_connections_apply_sqlite_tuning(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # A separate alias, SimpleTestCase forbids opening 'default' (which is left unconfigured)
+            config = database.sqlite_database(os.path.join(directory, 'db.sqlite3'))
+            connection = ConnectionHandler({'default': {}, 'tuning': config})['tuning']
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 20000)  # OPTIONS['timeout'], the only setting for it
+                self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+                self.assertGreater(connection.settings_dict['CONN_MAX_AGE'], 0)
+            finally:
+                connection.close()
+
+    def test_without_replicas_everything_uses_primary(self):
+        self.assertEqual(self.read_alias_during(self.factory.get('/videos/')), ['default'])
+
+    @mock.patch('myproj.database.replica_aliases', return_value=['replica1'])
+    def test_reads_go_to_replicas(self, replica_aliases):
+        self.assertEqual(self.read_alias_during(self.factory.get('/videos/')), ['replica1'])
+        self.assertEqual(self.router.db_for_write(Video), 'default')
+
+    @mock.patch('myproj.database.replica_aliases', return_value=['replica1'])
+    def test_client_reads_its_own_writes(self, replica_aliases):
+        liker = {'HTTP_AUTHORIZATION': 'Bearer liker'}
+        other = {'HTTP_AUTHORIZATION': 'Bearer other'}
+
+        self.assertEqual(self.read_alias_during(self.factory.post('/videos/1/like/', **liker)), ['default', 'default'])
+        self.assertEqual(self.read_alias_during(self.factory.get('/videos/', **liker)), ['default'])
+        self.assertEqual(self.read_alias_during(self.factory.get('/videos/', **other)), ['replica1'])
+
+        cache.clear()  # The pin expired
+        self.assertEqual(self.read_alias_during(self.factory.get('/videos/', **liker)), ['replica1'])
+
+    @mock.patch('myproj.database.replica_aliases', return_value=['replica1'])
+    def test_writes_outside_requests_do_not_pin(self, replica_aliases):
+        # A management command or thread: no middleware scope, nothing to leak
+        self.assertEqual(self.router.db_for_write(Like), 'default')
+        self.assertIsNone(database._pinned.get())
+        self.assertEqual(self.router.db_for_read(Video), 'default')
+
+    @mock.patch('myproj.database.replica_aliases', return_value=['replica1'])
+    def test_replicas_require_a_shared_cache(self, replica_aliases):
+        self.assertEqual([error.id for error in checks.check_replicas_have_shared_cache(None)], ['base.E001'])
+
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.check_replicas_have_shared_cache(None), [])
+
+    def test_write_benchmark_runs_without_lock_errors_when_tuned(self):
+        out = StringIO()
+        call_command('bench_db_writes', processes=2, writes=20, videos=5, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['modes']['tuned']['writes'], 40)
+        self.assertEqual(report['modes']['tuned']['locked_errors'], 0)
+
+
+class StartupTests(SimpleTestCase):
+    def setUp(self):
+        trending._youtube = trending._session = None
+        self.addCleanup(setattr, trending, '_youtube', None)
+        self.addCleanup(setattr, trending, '_session', None)
+
+    def test_client_libraries_load_lazily(self):
+        # Wall-clock time depends on the machine, the millisecond budget is for CI and manual runs
+        out = StringIO()
+        call_command('bench_startup', runs=1, max_ms=0, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['lazy_modules_loaded'], [])
+
+    def test_startup_budget_is_enforced(self):
+        with self.assertRaisesMessage(CommandError, "budget"):
+            call_command('bench_startup', runs=1, max_ms=1, stdout=StringIO())
+
+    def test_parse_importtime_keeps_cumulative_time_and_depth(self):
+        modules = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |   isodate.duration\n"
+            "import time:       250 |        350 | isodate\n"
+        )
+        self.assertEqual(modules, {'isodate.duration': (100, 100, 1), 'isodate': (250, 350, 0)})
+
+    @override_settings(YOUTUBE_API_KEY='key')
+    def test_warm_up_builds_shared_clients_once(self):
+        with mock.patch('base.trending.build', return_value=YouTubeStub()) as build:
+            trending.warm_up()
+            self.assertIs(trending.youtube_client(), trending.youtube_client())
+            self.assertIs(trending.http_session(), trending.http_session())
+        build.assert_called_once()
+
+    @override_settings(YOUTUBE_API_KEY=None)
+    def test_warm_up_skips_youtube_without_a_key(self):
+        with mock.patch('base.trending.build') as build:
+            trending.warm_up()
+        build.assert_not_called()
+        self.assertIsNotNone(trending._session)
@@ -0,0 +1,161 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (Prometheus style, cumulative)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('db', 'youtube', 'hf', 'serializer', 'total')
+
+_current = ContextVar('request_timings', default=None)
+
+_histograms = {}
+_query_counts = {}
+_metrics_lock = threading.Lock()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.db_queries = 0
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - start
+            self.db_queries += 1
+
+    def server_timing(self):
+        durations = self.durations
+        return (
+            f'db;dur={durations["db"] * 1000:.1f};desc="{self.db_queries} queries", '
+            f'youtube;dur={durations["youtube"] * 1000:.1f}, '
+            f'hf;dur={durations["hf"] * 1000:.1f}, '
+            f'serializer;dur={durations["serializer"] * 1000:.1f}, '
+            f'total;dur={durations["total"] * 1000:.1f}'
+        )
+
+
+@contextmanager
+def track(phase):
+    # Adds the time spent in the block to the current request, no-op outside one
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _record(route, timings):
+    with _metrics_lock:
+        histograms = _histograms.get(route)
+        if histograms is None:
+            histograms = _histograms[route] = {phase: Histogram() for phase in PHASES}
+        for phase, seconds in timings.durations.items():
+            histograms[phase].observe(seconds)
+        _query_counts[route] = _query_counts.get(route, 0) + timings.db_queries
+
+
+def render_metrics():
+    # Prometheus text exposition of the histograms collected by this worker
+    lines = [
+        '# HELP request_phase_seconds Time spent per request phase.',
+        '# TYPE request_phase_seconds histogram',
+    ]
+    with _metrics_lock:
+        for route, histograms in sorted(_histograms.items()):
+            for phase, histogram in histograms.items():
+                _render_histogram(lines, f'route="{route}",phase="{phase}"', histogram)
+        lines.append('# HELP request_db_queries_total Database queries issued per route.')
+        lines.append('# TYPE request_db_queries_total counter')
+        for route, count in sorted(_query_counts.items()):
+            lines.append(f'request_db_queries_total{{route="{route}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(lines, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'request_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'request_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'request_phase_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'request_phase_seconds_count{{{labels}}} {histogram.count}')
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _histograms.clear()
+        _query_counts.clear()
+
+
+class TimingMiddleware:
+    """
+    Records database, upstream API, serializer and total time for every request,
+    sends them back as a Server-Timing header, logs them as one JSON line and
+    aggregates them into per-route histograms served by the metrics view.
+
+    Phases can overlap: a query issued while serializing or fetching trending videos
+    counts towards db as well as serializer or youtube. total is the wall time.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        # Same as connection.execute_wrapper(), without a context manager per alias
+        wrappers = [conn.execute_wrappers for conn in connections.all()]
+        for execute_wrappers in wrappers:
+            execute_wrappers.append(timings.execute_wrapper)
+        try:
+            response = self.get_response(request)
+        finally:
+            for execute_wrappers in wrappers:
+                execute_wrappers.remove(timings.execute_wrapper)
+            _current.reset(token)
+        timings.add('total', time.perf_counter() - start)
+
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        response['Server-Timing'] = timings.server_timing()
+        _record(route, timings)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'route': route,
+                'method': request.method,
+                'status': response.status_code,
+                'db_queries': timings.db_queries,
+                **{f'{phase}_ms': round(seconds * 1000, 2) for phase, seconds in timings.durations.items()},
+            }))
+        return response
@@ -0,0 +1,170 @@
+"""
+Trending videos from YouTube, summarized and categorized with Hugging Face models.
+
+Only get_popular_educational_videos needs this, so views.py imports it lazily and the
+Google API client stack is not loaded by every worker and manage.py command. For
+gunicorn --preload deployments BaseConfig.ready() calls warm_up() so the shared
+clients are built once in the master process before it forks.
+"""
+import re
+
+import isodate
+import requests
+from django.conf import settings
+from googleapiclient.discovery import build
+
+from . import category_registry, timing
+from .models import Video
+
+YOUTUBE_API_SERVICE_NAME = "youtube"
+YOUTUBE_API_VERSION = "v3"
+
+_youtube = None
+_session = None
+
+
+def youtube_client():
+    # Building the client parses the discovery document, so it is done once per process
+    global _youtube
+    if _youtube is None:
+        _youtube = build(
+            YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
+            developerKey=settings.YOUTUBE_API_KEY, cache_discovery=False,
+        )
+    return _youtube
+
+
+def http_session():
+    # One session keeps connections to the Hugging Face API alive between calls
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
+def warm_up():
+    http_session()
+    # Without a key build() falls back to Google default credentials and fails, leave
+    # it to the first request to report that
+    if settings.YOUTUBE_API_KEY:
+        youtube_client()
+
+
+def fetch_popular_educational_videos():
+    def clean_text(text):
+        text = re.sub(r'#\w+', '', text)
+        text = re.sub(r'http[s]?://[^\s]+', '', text)
+        text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', text)
+        return ' '.join(text.split())
+
+    def generate_ai_description(title, description):
+        """
+        Generate AI-based description for the video using Hugging Face (or another AI service).
+        This function can be modified to use another service like OpenAI or any other model.
+        """
+        hf_api_url = "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"
+        headers = {"Authorization": f"Bearer {settings.HUGGINGFACE_API_KEY}"}
+
+        # Create the prompt for summarization
+        prompt = f"Title: {title}\nDescription: {description}\n\nSummarized Description:"
+
+        payload = {"inputs": prompt}
+
+        try:
+            with timing.track('hf'):
+                response = http_session().post(hf_api_url, headers=headers, json=payload)
+            response.raise_for_status()
+            predictions = response.json()
+            if predictions:
+                return predictions[0]['summary_text']  # Assuming the model returns 'summary_text'
+        except Exception as e:
+            print(f"Error using Hugging Face API for description: {e}")
+            return description  # Fall back to the original description if AI fails
+
+    def assign_category_huggingface(title, description):
+        hf_api_url = "https://api-inference.huggingface.co/models/facebook/bart-large-mnli"
+        headers = {"Authorization": f"Bearer {settings.HUGGINGFACE_API_KEY}"}
+
+        candidate_labels = category_registry.names()
+        payload = {
+            "inputs": f"Title: {title}\nDescription: {description}",
+            "parameters": {"candidate_labels": candidate_labels},
+        }
+
+        try:
+            with timing.track('hf'):
+                response = http_session().post(hf_api_url, headers=headers, json=payload)
+            response.raise_for_status()
+            predictions = response.json()
+            if predictions and "labels" in predictions:
+                return predictions["labels"][0]
+        except Exception as e:
+            print(f"Error using Hugging Face API for category assignment: {e}")
+
+        return "Uncategorized"
+
+    try:
+        with timing.track('youtube'):
+            youtube = youtube_client()
+
+        categories = ["28", "2", "26"]  # Multiple category IDs to fetch videos for
+        all_videos = []
+
+        # Fetch videos for each category individually
+        for category in categories:
+            with timing.track('youtube'):
+                trending_response = youtube.videos().list(
+                    part="snippet,contentDetails",
+                    chart="mostPopular",
+                    regionCode="US",
+                    maxResults=55,
+                    videoCategoryId=category,  # Single category ID at a time
+                ).execute()
+
+            for video in trending_response.get("items", []):
+                if len(all_videos) >= 10:
+                    break
+                try:
+                    duration_iso = video["contentDetails"]["duration"]
+                    duration_seconds = isodate.parse_duration(duration_iso).total_seconds()
+                    if duration_seconds > 100:
+                        if not video["contentDetails"].get("madeForKids", False):
+                            if video["snippet"].get("defaultAudioLanguage") == "en":
+                                original_title = video["snippet"]["title"]
+                                cleaned_title = clean_text(original_title)
+                                original_description = video["snippet"]["description"]
+                                cleaned_description = clean_text(original_description)
+
+                                # Get AI-generated description
+                                ai_generated_description = generate_ai_description(cleaned_title, cleaned_description)
+
+                                # Assign category after the video data is fetched
+                                assigned_category_name = assign_category_huggingface(cleaned_title, cleaned_description)
+                                assigned_category_id = category_registry.id_for(assigned_category_name)
+
+                                all_videos.append({
+                                    "id": video["id"],
+                                    "title": cleaned_title,
+                                    "description": ai_generated_description,  # Use AI-generated description
+                                    "thumbnail": video["snippet"]["thumbnails"]["high"]["url"],
+                                    "channelTitle": video["snippet"]["channelTitle"],
+                                    "publishedAt": video["snippet"]["publishedAt"],
+                                    "category": assigned_category_name,
+                                    "categoryId": assigned_category_id,
+                                })
+                except KeyError as e:
+                    print(f"Missing key in video response: {e}")
+                    continue
+
+        # Flag trending videos that were already submitted, matched on the canonical id in one query
+        submitted = dict(
+            Video.objects.filter(youtube_id__in=[video["id"] for video in all_videos]).values_list('youtube_id', 'id')
+        )
+        for video in all_videos:
+            video["submittedVideoId"] = submitted.get(video["id"])
+
+        return {"videos": all_videos}, 200
+
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        return {"error": str(e)}, 500
@@ -4,12 +4,13 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (VideoViewSet, CategoryViewSet, MyTokenObtainPairView,
 UserRegisterView, UserProfileView, LikedVideosView, ChangePasswordView, UploadedVideosView,
 UserListView, ToggleAdminStatusView, ToggleUserActiveStatusView, get_popular_educational_videos,
-recommend_videos)
+recommend_videos, metrics, RequestProfileViewSet, ProfileTokenView)
 
 
 router = DefaultRouter()
 router.register('videos', VideoViewSet, basename='video')
 router.register('categories', CategoryViewSet)
+router.register('profiles', RequestProfileViewSet)
 
 
 urlpatterns = [
@@ -26,5 +27,7 @@ urlpatterns = [
     path('users/<int:user_id>/toggle-active/', ToggleUserActiveStatusView.as_view(), name='toggle_user_active'),
     path('api/popular-videos/', get_popular_educational_videos, name='popular_videos'),
     path('api/recommend-videos/', recommend_videos, name='recommend_videos'),
+    path('api/metrics/', metrics, name='metrics'),
+    path('api/profile-token/', ProfileTokenView.as_view(), name='profile_token'),
 
 ]
@@ -1,6 +1,6 @@
 from rest_framework import viewsets, permissions, generics, status
-from .models import Video, Category, Like
-from .serializers import VideoSerializer, CategorySerializer, UserSerializer
+from .models import Video, Category, Like, RequestProfile
+from .serializers import VideoSerializer, CategorySerializer, UserSerializer, RequestProfileSerializer
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -12,18 +12,22 @@ from rest_framework.views import APIView
 from django.contrib.auth.hashers import check_password
 from datetime import datetime
 from rest_framework.decorators import api_view
-from googleapiclient.discovery import build
 from django.conf import settings
-import requests
-import isodate
 import random
 from collections import Counter
+from django.db.models import Exists, F, OuterRef, Value
+from django.http import HttpResponse, HttpResponseForbidden
+from . import category_registry, hot, profiling, singleflight, timing
 
 
 
-YOUTUBE_API_KEY = settings.YOUTUBE_API_KEY
-YOUTUBE_API_SERVICE_NAME = "youtube"
-YOUTUBE_API_VERSION = "v3"
+def with_card_data(queryset, user):
+    # Everything a video card needs in a constant number of queries: the uploader and
+    # categories are fetched in bulk and liked_by_me is one EXISTS subquery per row
+    queryset = queryset.select_related('user').prefetch_related('categories')
+    if not user.is_authenticated:
+        return queryset.annotate(liked_by_me=Value(False))
+    return queryset.annotate(liked_by_me=Exists(Like.objects.filter(user=user, video=OuterRef('pk'))))
 
 class VideoViewSet(viewsets.ModelViewSet):
     serializer_class = VideoSerializer
@@ -60,11 +64,18 @@ class VideoViewSet(viewsets.ModelViewSet):
             # Non-admins can only see approved and not denied videos
             queryset = queryset.filter(approved=True, denied=False)
 
-        return queryset
+        # ?ordering=hot lists the HOT_VIDEOS_LIMIT top videos by time-decayed likes, read in
+        # order off video_visible_hot_idx
+        if self.action == 'list' and self.request.query_params.get('ordering') == 'hot':
+            return with_card_data(queryset.order_by('-hot_score', '-id'), user)[:settings.HOT_VIDEOS_LIMIT]
+
+        return with_card_data(queryset, user)
 
     def perform_create(self, serializer):
         # Associate the video with the currently authenticated user
-        serializer.save(user=self.request.user)
+        video = serializer.save(user=self.request.user)
+        # Not loaded through get_queryset, so set the annotation a new video would get
+        video.liked_by_me = False
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
     def like(self, request, pk=None):
@@ -76,11 +87,15 @@ class VideoViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'You have already liked this video.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Create a new Like object
-        Like.objects.create(user=user, video=video)
+        like = Like.objects.create(user=user, video=video)
 
-        # Increment the like count on the video
-        video.likes += 1
-        video.save()
+        # Increment the like count and fold the like into the hot score in one UPDATE, so
+        # concurrent likes and unlikes are not lost
+        Video.objects.filter(pk=video.pk).update(
+            likes=F('likes') + 1,
+            hot_score=hot.add_expression(F('hot_score'), hot.event_score(like.created_at)),
+        )
+        singleflight.forget(singleflight.make_key('recommend-videos', user=user.pk))
 
         return Response({'detail': 'Video liked successfully.'}, status=status.HTTP_200_OK)
     
@@ -97,9 +112,14 @@ class VideoViewSet(viewsets.ModelViewSet):
         # Remove the Like object
         like_instance.delete()
 
-        # Decrement the like count on the video
-        video.likes -= 1
-        video.save()
+        # Decrement the like count and take the like back out of the hot score, like like() does
+        Video.objects.filter(pk=video.pk).update(
+            likes=F('likes') - 1,
+            hot_score=hot.remove_expression(
+                F('hot_score'), hot.event_score(like_instance.created_at), floor=hot.event_score(video.createdTime)
+            ),
+        )
+        singleflight.forget(singleflight.make_key('recommend-videos', user=user.pk))
 
         return Response({'detail': 'Video unliked successfully.'}, status=status.HTTP_200_OK)
 
@@ -113,6 +133,41 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+class RequestProfileViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = RequestProfile.objects.select_related('user').defer('stats').order_by('-created_at')
+    serializer_class = RequestProfileSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        route = self.request.query_params.get('route')
+        if route:
+            queryset = queryset.filter(route=route)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        profile = self.get_object()
+        data = bytes(profile.stats)
+
+        # ?as=text returns a readable report, otherwise the raw .prof file for pstats/snakeviz
+        if request.query_params.get('as') == 'text':
+            return HttpResponse(profiling.stats_report(data), content_type='text/plain')
+        response = HttpResponse(data, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.prof"'
+        return response
+
+class ProfileTokenView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        # Requests sent with this token in the X-Profile-Token header get profiled
+        return Response({
+            "token": profiling.make_token(request.user),
+            "header": "X-Profile-Token",
+            "expires_in": settings.PROFILE_TOKEN_MAX_AGE,
+        })
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -142,14 +197,14 @@ class LikedVideosView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Video.objects.filter(like__user=user).order_by('-like__created_at')
+        return with_card_data(Video.objects.filter(like__user=user).order_by('-like__created_at'), user)
 
 class UploadedVideosView(generics.ListAPIView):
     serializer_class = VideoSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Video.objects.filter(user=self.request.user).order_by('-createdTime')
+        return with_card_data(Video.objects.filter(user=self.request.user).order_by('-createdTime'), self.request.user)
     
 class ChangePasswordView(generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -216,157 +271,74 @@ class ToggleUserActiveStatusView(APIView):
 
 @api_view(['GET'])
 def get_popular_educational_videos(request):
-    def clean_text(text):
-        import re
-        text = re.sub(r'#\w+', '', text)
-        text = re.sub(r'http[s]?://[^\s]+', '', text)
-        text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', text)
-        return ' '.join(text.split())
-
-    def generate_ai_description(title, description):
-        """
-        Generate AI-based description for the video using Hugging Face (or another AI service).
-        This function can be modified to use another service like OpenAI or any other model.
-        """
-        hf_api_url = "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"
-        headers = {"Authorization": f"Bearer {settings.HUGGINGFACE_API_KEY}"}
-
-        # Create the prompt for summarization
-        prompt = f"Title: {title}\nDescription: {description}\n\nSummarized Description:"
-
-        payload = {"inputs": prompt}
-
-        try:
-            response = requests.post(hf_api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            predictions = response.json()
-            if predictions:
-                return predictions[0]['summary_text']  # Assuming the model returns 'summary_text'
-        except Exception as e:
-            print(f"Error using Hugging Face API for description: {e}")
-            return description  # Fall back to the original description if AI fails
-
-    def assign_category_huggingface(title, description):
-        hf_api_url = "https://api-inference.huggingface.co/models/facebook/bart-large-mnli"
-        headers = {"Authorization": f"Bearer {settings.HUGGINGFACE_API_KEY}"}
-
-        candidate_labels = list(Category.objects.values_list('name', flat=True))
-        payload = {
-            "inputs": f"Title: {title}\nDescription: {description}",
-            "parameters": {"candidate_labels": candidate_labels},
-        }
-
-        try:
-            response = requests.post(hf_api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            predictions = response.json()
-            if predictions and "labels" in predictions:
-                return predictions["labels"][0]
-        except Exception as e:
-            print(f"Error using Hugging Face API for category assignment: {e}")
-
-        return "Uncategorized"
-
-    try:
-        youtube = build("youtube", "v3", developerKey=settings.YOUTUBE_API_KEY)
-
-        categories = ["28", "2", "26"]  # Multiple category IDs to fetch videos for
-        all_videos = []
-
-        # Fetch videos for each category individually
-        for category in categories:
-            trending_response = youtube.videos().list(
-                part="snippet,contentDetails",
-                chart="mostPopular",
-                regionCode="US",
-                maxResults=55,
-                videoCategoryId=category,  # Single category ID at a time
-            ).execute()
-
-            for video in trending_response.get("items", []):
-                if len(all_videos) >= 10:
-                    break
-                try:
-                    duration_iso = video["contentDetails"]["duration"]
-                    duration_seconds = isodate.parse_duration(duration_iso).total_seconds()
-                    if duration_seconds > 100:
-                        if not video["contentDetails"].get("madeForKids", False):
-                            if video["snippet"].get("defaultAudioLanguage") == "en":
-                                original_title = video["snippet"]["title"]
-                                cleaned_title = clean_text(original_title)
-                                original_description = video["snippet"]["description"]
-                                cleaned_description = clean_text(original_description)
-
-                                # Get AI-generated description
-                                ai_generated_description = generate_ai_description(cleaned_title, cleaned_description)
-
-                                # Assign category after the video data is fetched
-                                assigned_category_name = assign_category_huggingface(cleaned_title, cleaned_description)
-                                try:
-                                    assigned_category_id = Category.objects.get(name=assigned_category_name).id
-                                except Category.DoesNotExist:
-                                    pass
-
-                                all_videos.append({
-                                    "id": video["id"],
-                                    "title": cleaned_title,
-                                    "description": ai_generated_description,  # Use AI-generated description
-                                    "thumbnail": video["snippet"]["thumbnails"]["high"]["url"],
-                                    "channelTitle": video["snippet"]["channelTitle"],
-                                    "publishedAt": video["snippet"]["publishedAt"],
-                                    "category": assigned_category_name,
-                                    "categoryId": assigned_category_id,
-                                })
-                except KeyError as e:
-                    print(f"Missing key in video response: {e}")
-                    continue
-
-        return Response({"videos": all_videos}, status=200)
-
-    except Exception as e:
-        print(f"Error occurred: {str(e)}")
-        return Response({"error": str(e)}, status=500)
+    # Imported here so workers and manage.py commands that never serve this route
+    # do not load the Google API client stack
+    from . import trending
+
+    # Concurrent requests share one upstream fetch; errors are not cached. The fetch takes no
+    # parameters, so the query string is left out of the key and cannot bypass the cache
+    key = singleflight.make_key('popular-videos')
+    data, status_code = singleflight.coalesce(
+        key,
+        trending.fetch_popular_educational_videos,
+        ttl=settings.POPULAR_VIDEOS_TTL,
+        stale_ttl=settings.POPULAR_VIDEOS_STALE_TTL,
+        should_cache=lambda result: result[1] == 200,
+    )
+    return Response(data, status=status_code)
 
 @api_view(['GET'])
 def recommend_videos(request):
     user = request.user
+    # Keyed on the user only, the query string does not change the result and like/unlike
+    # must be able to clear the one cached entry
+    key = singleflight.make_key('recommend-videos', user=user.pk)
+    data, status_code = singleflight.coalesce(
+        key,
+        lambda: recommend_videos_for(user),
+        ttl=settings.RECOMMEND_VIDEOS_TTL,
+    )
+    return Response(data, status=status_code)
 
+def recommend_videos_for(user):
     # Get the last 7 liked videos
-    liked_videos = Like.objects.filter(user=user).order_by('-created_at')[:7]
-    liked_video_ids = liked_videos.values_list('video_id', flat=True)
+    liked_video_ids = list(Like.objects.filter(user=user).order_by('-created_at').values_list('video_id', flat=True)[:7])
 
-    # Get the categories of these 7 videos
-    categories = []
-    for video in Video.objects.filter(id__in=liked_video_ids):
-        categories.extend([category.name for category in video.categories.all()])
+    # Get the categories of these 7 videos, names come from the category registry
+    VideoCategory = Video.categories.through
+    category_ids = VideoCategory.objects.filter(video_id__in=liked_video_ids).values_list('category_id', flat=True)
+    categories = [category_registry.name_of(category_id) for category_id in category_ids]
 
     # Count the most common category
     category_counts = Counter(categories)
     favorite_category = category_counts.most_common(1)[0][0] if category_counts else None
 
     if not favorite_category:
-        return Response({"message": "No favorite category found to recommend videos."}, status=400)
+        return {"message": "No favorite category found to recommend videos."}, 400
 
-    # Retrieve the Category object for the favorite category
-    favorite_category_obj = Category.objects.filter(name=favorite_category).first()
-    if not favorite_category_obj:
-        return Response({"error": "Favorite category does not exist"}, status=400)
+    # Retrieve the id of the favorite category
+    favorite_category_id = category_registry.id_for(favorite_category)
+    if favorite_category_id is None:
+        return {"error": "Favorite category does not exist"}, 400
 
-    # Get all the videos and their categories
-    all_videos = Video.objects.all().prefetch_related('categories')
-    
     # Get the liked videos of the user
     liked_video_ids = Like.objects.filter(user=user).values_list('video_id', flat=True)
 
     # Filter videos by the favorite category, exclude the liked ones, and order by likes (desc)
     videos_in_category = (
-        all_videos.filter(categories=favorite_category_obj)
+        Video.objects.filter(categories__id=favorite_category_id)
         .exclude(id__in=liked_video_ids)
+        .select_related('user')
         .order_by('-likes')  # Order by likes in descending order
     )
 
     # Select the top 5 most liked videos
-    recommended_videos = videos_in_category[:5]
+    recommended_videos = list(videos_in_category[:5])
+
+    # Category ids of the recommended videos in one query on the join table
+    video_category_ids = {video.id: [] for video in recommended_videos}
+    for video_id, category_id in VideoCategory.objects.filter(video_id__in=video_category_ids).values_list('video_id', 'category_id'):
+        video_category_ids[video_id].append(category_id)
 
     # Serialize the recommended videos
     videos_data = []
@@ -375,7 +347,7 @@ def recommend_videos(request):
             "id": video.id,
             "description": video.description,
             "link": video.link,
-            "categories": [category.id for category in video.categories.all()],  # Return category IDs
+            "categories": video_category_ids[video.id],  # Return category IDs
             "likes": video.likes,  
             "user": video.user.username,
             "approved": video.approved,
@@ -390,4 +362,10 @@ def recommend_videos(request):
         "recommended_videos": videos_data,
     }
 
-    return Response(response_data, status=200)
+    return response_data, 200
+
+def metrics(request):
+    # Prometheus scrape endpoint; histograms are kept per worker process
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(timing.render_metrics(), content_type='text/plain; version=0.0.4')
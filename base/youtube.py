@@ -0,0 +1,37 @@
+import re
+from urllib.parse import parse_qs, urlparse
+
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+PATH_PREFIXES = {'embed', 'shorts', 'v', 'live'}
+
+
+def parse_video_id(link):
+    """
+    Return the 11 character video id of a YouTube link, or None if it is not one.
+    youtu.be/X, youtube.com/watch?v=X&t=10, m.youtube.com/watch?v=X and
+    youtube.com/embed|shorts|live/X all give the same id.
+    """
+    if '://' not in link:
+        link = f"https://{link}"
+    url = urlparse(link.strip())
+    host = (url.hostname or '').lower()
+    parts = [part for part in url.path.split('/') if part]
+
+    if host in SHORT_HOSTS:
+        candidate = parts[0] if parts else ''
+    elif host in HOSTS:
+        if parts == ['watch']:
+            candidate = parse_qs(url.query).get('v', [''])[0]
+        elif len(parts) >= 2 and parts[0] in PATH_PREFIXES:
+            candidate = parts[1]
+        else:
+            candidate = ''
+    else:
+        return None
+
+    return candidate if VIDEO_ID.match(candidate) else None
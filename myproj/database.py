@@ -0,0 +1,120 @@
+"""
+Database configuration for myproj.
+
+SQLite is tuned for several gunicorn workers writing at once (WAL journal, a busy
+timeout instead of instant "database is locked" errors, IMMEDIATE write transactions)
+and connections are kept open between requests. Read replicas can be added through
+DATABASE_REPLICAS; PrimaryReplicaRouter then sends reads made while serving a
+request to them and everything else to the primary, and ReadYourWritesMiddleware
+keeps a client on the primary for a short while after it wrote something so it
+never reads a stale copy of its own like or submission. That pin is kept in the
+cache, so replicas need a cache shared by all workers (base/checks.py enforces it).
+"""
+import hashlib
+import os
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Applied by Django on every new SQLite connection
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',  # Readers no longer block the writer and vice versa
+    'PRAGMA synchronous=NORMAL',  # Safe with WAL, avoids an fsync per commit
+]
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# None outside ReadYourWritesMiddleware, then whether the request must stay on the primary
+_pinned = ContextVar('database_pinned_to_primary', default=None)
+
+
+def sqlite_database(name, **extra):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 600)),  # Reuse connections across requests
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            # Take the write lock when the transaction starts, so two workers cannot
+            # both read and then deadlock upgrading to a write lock
+            'transaction_mode': 'IMMEDIATE',
+            # SQLite's busy timeout: wait up to 20s for the write lock instead of failing
+            # with "database is locked"
+            'timeout': 20,
+        },
+        **extra,
+    }
+
+
+def databases(base_dir):
+    # DATABASE_REPLICAS is a comma separated list of read-only copies of the primary
+    # (for example LiteFS or Litestream replicas), each becomes a replicaN alias
+    config = {'default': sqlite_database(os.getenv('DATABASE_PATH', base_dir / 'db.sqlite3'))}
+    replicas = [path.strip() for path in os.getenv('DATABASE_REPLICAS', '').split(',') if path.strip()]
+    for number, path in enumerate(replicas, start=1):
+        config[f'replica{number}'] = sqlite_database(path, TEST={'MIRROR': 'default'})
+    return config
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Management commands and background threads are not scoped by the middleware and
+        # always read from the primary, so they never miss their own writes
+        replicas = replica_aliases()
+        if not replicas or _pinned.get() is not False:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Later reads in the same request see this write, the middleware resets it afterwards
+        if _pinned.get() is not None:
+            _pinned.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def _pin_key(request):
+    # Clients authenticate with a bearer token, which identifies them before the view runs
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return f"db-pin:{hashlib.sha256(authorization.encode()).hexdigest()}"
+
+
+class ReadYourWritesMiddleware:
+    """
+    Sends every query of a write request, and the reads of the same client for
+    DATABASE_PIN_SECONDS afterwards, to the primary. Does nothing without replicas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        key = _pin_key(request)
+        is_write = request.method not in SAFE_METHODS
+        token = _pinned.set(is_write or bool(key and cache.get(key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+        if is_write and key and response.status_code < 400:
+            cache.set(key, True, settings.DATABASE_PIN_SECONDS)
+        return response
@@ -14,6 +14,7 @@ from datetime import timedelta
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from . import database
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -21,6 +22,10 @@ load_dotenv()
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 
+# Build the YouTube and Hugging Face clients at startup (set for gunicorn --preload),
+# otherwise they are imported and built on the first trending request
+PRELOAD_CLIENTS = os.getenv("PRELOAD_CLIENTS") == "1"
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -66,6 +71,8 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'base.timing.TimingMiddleware',  # First so its total covers every other middleware
+    'myproj.database.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +81,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
+    'base.profiling.ProfilingMiddleware',  # Last so it only wraps the view itself
 ]
 
 ROOT_URLCONF = 'myproj.urls'
@@ -100,12 +108,13 @@ WSGI_APPLICATION = 'myproj.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# WAL/busy_timeout pragmas, persistent connections and optional read replicas,
+# see myproj/database.py
+DATABASES = database.databases(BASE_DIR)
+DATABASE_ROUTERS = ['myproj.database.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write
+DATABASE_PIN_SECONDS = 5
 
 
 # Password validation
@@ -151,3 +160,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 ALLOWED_HOSTS = ['*']
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Cache shared by the request coalescing layer (base/singleflight.py).
+# Point this at a cache every worker can see (redis, memcached, database) so
+# concurrent workers also share one computation; locmem only coalesces per process.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds results stay fresh, and how long stale ones are served while refreshing
+POPULAR_VIDEOS_TTL = 60 * 60
+POPULAR_VIDEOS_STALE_TTL = 60 * 60 * 24
+RECOMMEND_VIDEOS_TTL = 60
+
+# Addresses allowed to scrape the per-route timing histograms at /api/metrics/
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'base.timing': {
+            'handlers': ['console'],
+            # Set TIMING_LOG_LEVEL=INFO to log one JSON line per request
+            'level': os.getenv('TIMING_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# On-demand profiling (base/profiling.py): lifetime of staff-issued X-Profile-Token
+# values, how often each worker re-reads the cached ProfileRule table and how many
+# stored profiles are kept per route (older ones are deleted as new ones come in)
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+PROFILE_RULES_REFRESH = 30
+PROFILE_KEEP_PER_ROUTE = 200
+
+# Seconds after which a like counts half as much towards Video.hot_score (base/hot.py)
+# and how many videos /videos/?ordering=hot returns
+HOT_HALF_LIFE = 60 * 60 * 24
+HOT_VIDEOS_LIMIT = 50
+
+# Seconds between checks of the CategoryVersion row (base/category_registry.py)
+CATEGORY_REGISTRY_CHECK_INTERVAL = 1